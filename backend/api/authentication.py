@@ -0,0 +1,76 @@
+import copy
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram_backend.routers import PRIMARY_DB
+
+from . import invalidation
+from .cache import LocalLRUCache, bump_generation
+
+local_tokens = LocalLRUCache(
+    settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+    settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT,
+)
+invalidation.register('auth_tokens', local_tokens.clear)
+
+
+def token_cache_key(key):
+    return 'auth_token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_tokens(keys):
+    """Удаляет токены из локального и общего кеша.
+
+    Локальные кеши других процессов сбрасываются в начале их следующего
+    запроса по новому поколению 'auth_tokens'.
+    """
+    cache_keys = [token_cache_key(key) for key in keys]
+    for cache_key in cache_keys:
+        local_tokens.delete(cache_key)
+    if cache_keys:
+        cache.delete_many(cache_keys)
+        bump_generation('auth_tokens')
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication с двухуровневым кешем токен -> пользователь.
+
+    Сначала проверяется LRU-кеш процесса, затем общий кеш Django и только
+    потом база данных. Кеши сбрасываются сигналами при удалении токена
+    (выход через djoser) и при сохранении пользователя (смена пароля,
+    деактивация); локальные кеши остальных процессов сбрасываются через
+    api.invalidation в начале их следующего запроса.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        token = local_tokens.get(cache_key)
+        if token is None:
+            token = cache.get(cache_key)
+            if token is None:
+                try:
+                    # Новый токен может ещё не дойти до реплик.
+                    token = Token.objects.using(PRIMARY_DB).select_related(
+                        'user'
+                    ).get(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                cache.set(
+                    cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT
+                )
+            local_tokens.set(cache_key, token)
+        # Экземпляр из локального кеша общий для потоков процесса.
+        token = copy.deepcopy(token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return (token.user, token)
@@ -0,0 +1,198 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """Кеш в памяти процесса с ограничением размера и временем жизни."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def generation_key(namespace):
+    return f'generation:{namespace}'
+
+
+def get_generation(namespace):
+    """Текущее поколение пространства имён кеша."""
+    key = generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        # Начальное значение от времени, чтобы после вытеснения счётчика
+        # не совпасть с поколением ещё живых записей.
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(namespace):
+    """Делает недействительными все записи пространства имён."""
+    key = generation_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+class Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = _MISSING
+
+
+flights = {}
+flights_lock = threading.Lock()
+
+
+def single_flight(key, call, wait=None):
+    """Выполняет call() один раз на key среди потоков процесса.
+
+    Потоки, пришедшие с тем же key, пока call() выполняется, ждут его
+    результат не дольше wait секунд и не повторяют работу. Если ведущий
+    поток упал или не уложился, ожидавший выполняет call() сам.
+    """
+    if wait is None:
+        wait = settings.CACHE_BUILD_LOCK_TIMEOUT
+    with flights_lock:
+        flight = flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = flights[key] = Flight()
+    if not leader:
+        if flight.done.wait(wait) and flight.value is not _MISSING:
+            return flight.value
+        return call()
+    try:
+        flight.value = call()
+        return flight.value
+    finally:
+        with flights_lock:
+            del flights[key]
+        flight.done.set()
+
+
+class Entry(namedtuple('Entry', 'value fresh_until')):
+    """Значение кеша со сроком свежести."""
+
+    def is_fresh(self):
+        return self.fresh_until > time.time()
+
+
+def get_entry(key):
+    entry = cache.get(key)
+    return entry if isinstance(entry, Entry) else None
+
+
+def lease(key):
+    """Общая для всех процессов аренда на перестроение ключа."""
+    return cache.add(f'{key}:lock', 1, settings.CACHE_BUILD_LOCK_TIMEOUT)
+
+
+def rebuild(key, build, timeout, stale_timeout):
+    try:
+        value = build()
+        cache.set(
+            key, Entry(value, time.time() + timeout), timeout + stale_timeout
+        )
+    finally:
+        cache.delete(f'{key}:lock')
+    return value
+
+
+def fill(key, build, timeout, stale_timeout):
+    """Строит отсутствующее значение; из всех процессов -- только один."""
+    if lease(key):
+        return rebuild(key, build, timeout, stale_timeout)
+    deadline = time.monotonic() + settings.CACHE_BUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = get_entry(key)
+        if entry is not None:
+            return entry.value
+    return build()
+
+
+def get_or_build(key, build, timeout, stale_timeout=None):
+    """Значение из кеша; при промахе его строит только один запрос.
+
+    Потоки процесса ждут ведущего через single_flight, другие процессы --
+    пока он держит аренду в общем кеше, но не дольше CACHE_BUILD_WAIT
+    секунд. Запись живёт на stale_timeout секунд дольше срока свежести:
+    устаревшее значение сразу отдаётся всем, кроме одного запроса,
+    который его перестраивает.
+    """
+    if stale_timeout is None:
+        stale_timeout = settings.CACHE_STALE_TIMEOUT
+    entry = get_entry(key)
+    if entry is not None:
+        if entry.is_fresh() or not lease(key):
+            return entry.value
+        return rebuild(key, build, timeout, stale_timeout)
+    return single_flight(
+        key, lambda: fill(key, build, timeout, stale_timeout),
+        settings.CACHE_BUILD_WAIT
+    )
+
+
+def query_cache_key(prefix, request):
+    """Ключ кеша по адресу запроса с нормализованной строкой параметров."""
+    params = sorted(
+        (name, sorted(value for value in values if value))
+        for name, values in request.query_params.lists()
+    )
+    query = urlencode(
+        [(name, value) for name, values in params for value in values]
+    )
+    # Хост входит в ключ: ссылки пагинации в ответе абсолютные.
+    url = request.build_absolute_uri(request.path) + '?' + query
+    return f'{prefix}:' + hashlib.md5(url.encode()).hexdigest()
+
+
+def fragment_cache_key(generation, recipe_id):
+    return f'recipes:fragment:{generation}:{recipe_id}'
+
+
+def invalidate_fragments(*recipe_ids):
+    generation = get_generation('recipe_fragments')
+    cache.delete_many(
+        [fragment_cache_key(generation, pk) for pk in recipe_ids]
+    )
@@ -0,0 +1,171 @@
+"""Ограничение числа одновременных тяжёлых запросов.
+
+Семафор хранится в общем кеше: CONCURRENCY_LIMITS[scope] слотов-ключей,
+слот занимается атомарным cache.add и освобождается удалением. Поэтому
+лимит общий для всех воркеров, а слот упавшего воркера освобождается сам
+через CONCURRENCY_LEASE секунд. Не получивший слот запрос ждёт до
+CONCURRENCY_QUEUE_TIMEOUT секунд и затем получает 503 с Retry-After,
+не занимая воркер, нужный дешёвым запросам.
+"""
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions, status
+
+POLL_INTERVAL = 0.05
+
+
+class Overloaded(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Сервер перегружен, повторите запрос позже.')
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+def slot_key(scope, number):
+    return f'concurrency:{scope}:slot:{number}'
+
+
+def gauge_key(scope, name):
+    return f'concurrency:{scope}:{name}'
+
+
+def gauge_add(scope, name, delta):
+    key = gauge_key(scope, name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, max(delta, 0), None)
+
+
+class Semaphore:
+
+    def __init__(self, scope, limit):
+        self.scope = scope
+        self.limit = limit
+        self.token = uuid.uuid4().hex
+        self.key = None
+
+    def try_acquire(self):
+        keys = [slot_key(self.scope, number) for number in range(self.limit)]
+        taken = cache.get_many(keys)
+        free = [key for key in keys if key not in taken]
+        random.shuffle(free)
+        for key in free:
+            if cache.add(key, self.token, settings.CONCURRENCY_LEASE):
+                self.key = key
+                return True
+        return False
+
+    def acquire(self, timeout):
+        """Занимает слот, ожидая не дольше timeout секунд."""
+        if self.try_acquire():
+            return True
+        deadline = time.monotonic() + timeout
+        gauge_add(self.scope, 'waiting', 1)
+        try:
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                if self.try_acquire():
+                    return True
+        finally:
+            gauge_add(self.scope, 'waiting', -1)
+        gauge_add(self.scope, 'rejected', 1)
+        return False
+
+    def release(self):
+        if self.key is None:
+            return
+        # Слот мог истечь и достаться другому запросу.
+        if cache.get(self.key) == self.token:
+            cache.delete(self.key)
+        self.key = None
+
+
+def stats(scopes=None):
+    """{область: {active, limit, waiting, rejected}} по общему кешу."""
+    limits = settings.CONCURRENCY_LIMITS
+    result = {}
+    for scope in scopes or limits:
+        keys = [slot_key(scope, number) for number in range(limits[scope])]
+        values = cache.get_many(keys + [
+            gauge_key(scope, 'waiting'), gauge_key(scope, 'rejected')
+        ])
+        result[scope] = {
+            'active': sum(key in values for key in keys),
+            'limit': limits[scope],
+            'waiting': max(values.get(gauge_key(scope, 'waiting'), 0), 0),
+            'rejected': values.get(gauge_key(scope, 'rejected'), 0),
+        }
+    return result
+
+
+class HeldStream:
+    """Тело потокового ответа, удерживающее слот семафора.
+
+    Слот освобождается, когда тело дочитано или ответ закрыт сервером,
+    в том числе если клиент отключился, не дочитав ответ.
+    """
+
+    def __init__(self, content, semaphore):
+        self.content = iter(content)
+        self.semaphore = semaphore
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def close(self):
+        self.semaphore.release()
+
+
+class ConcurrencyLimitMixin:
+    """Лимит одновременных запросов для действий из concurrency_scopes.
+
+    concurrency_scopes -- словарь действие -> область CONCURRENCY_LIMITS.
+    Слот занимается после аутентификации, прав и throttling, чтобы
+    отклонённые запросы его не расходовали, и освобождается по выходе
+    из dispatch, а для потокового ответа -- после отдачи его тела.
+    """
+    concurrency_scopes = {}
+
+    def get_concurrency_scope(self):
+        return self.concurrency_scopes.get(self.action)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        scope = self.get_concurrency_scope()
+        if scope is None:
+            return
+        semaphore = Semaphore(scope, settings.CONCURRENCY_LIMITS[scope])
+        if not semaphore.acquire(settings.CONCURRENCY_QUEUE_TIMEOUT):
+            raise Overloaded(settings.CONCURRENCY_RETRY_AFTER)
+        self.semaphore = semaphore
+
+    def dispatch(self, request, *args, **kwargs):
+        self.semaphore = None
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if self.semaphore is not None and response.streaming:
+                response.streaming_content = HeldStream(
+                    response.streaming_content, self.semaphore
+                )
+                self.semaphore = None
+            return response
+        finally:
+            if self.semaphore is not None:
+                self.semaphore.release()
@@ -0,0 +1,85 @@
+"""ETag и Last-Modified для рецептов без сериализации ответа."""
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return quote_etag(
+        hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    )
+
+
+def timestamp(value):
+    return timegm(value.utctimetuple()) if value else None
+
+
+def recipe_validators(recipe, user):
+    """Валидаторы ответа с одним рецептом.
+
+    Для авторизованного пользователя в ответе есть признаки избранного и
+    корзины, поэтому ETag учитывает их, а Last-Modified не отдаётся.
+    """
+    if not user.is_authenticated:
+        return (
+            make_etag(recipe.pk, recipe.updated_at.isoformat()),
+            timestamp(recipe.updated_at),
+        )
+    return make_etag(
+        recipe.pk, recipe.updated_at.isoformat(), user.pk,
+        user.recipe_follower.filter(recipe=recipe).exists(),
+        user.shopping_cart.filter(recipe=recipe).exists(),
+    ), None
+
+
+def recipe_list_validators(queryset, *extra):
+    """Валидаторы списка: число рецептов и время последнего изменения.
+
+    extra добавляется в ETag, если порядок списка зависит не только от
+    самих рецептов.
+    """
+    stats = queryset.order_by().aggregate(
+        count=Count('id', distinct=True), last=Max('updated_at')
+    )
+    last = stats['last']
+    return (
+        make_etag(stats['count'], last.isoformat() if last else '', *extra),
+        timestamp(last),
+    )
+
+
+def recipe_search_validators(queryset, found):
+    """Валидаторы списка найденных по индексу рецептов.
+
+    Набор id входит в ETag целиком, время -- последнего изменения всего
+    каталога: максимум updated_at берётся по индексу без передачи id в SQL.
+    """
+    last = queryset.order_by().aggregate(last=Max('updated_at'))['last']
+    return (
+        make_etag(
+            hashlib.md5(found.tobytes()).hexdigest(),
+            last.isoformat() if last else ''
+        ),
+        timestamp(last),
+    )
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    """Ответ 304/412 по заголовкам If-* или None."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
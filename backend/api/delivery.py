@@ -0,0 +1,115 @@
+"""Отдача сгенерированных файлов через шлюз.
+
+Файл записывается в SPOOL_ROOT, а ответ содержит только заголовок
+X-Accel-Redirect (nginx) или X-Sendfile: байты отдаёт шлюз через
+sendfile, и медленный клиент не занимает воркер. В режиме 'python'
+(разработка без шлюза) файл отдаёт сам Django. Файлы старше
+SPOOL_MAX_AGE удаляются командой purge_spool и попутно при записи.
+"""
+import os
+import time
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+PURGE_INTERVAL = 10 * 60
+
+last_purge = 0
+
+
+def content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def purge(max_age=None):
+    """Удаляет файлы спула старше max_age секунд, возвращает их число."""
+    if max_age is None:
+        max_age = settings.SPOOL_MAX_AGE
+    deadline = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(settings.SPOOL_ROOT))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def purge_periodically():
+    global last_purge
+    now = time.monotonic()
+    if now - last_purge >= PURGE_INTERVAL:
+        last_purge = now
+        purge()
+
+
+def spool(write, suffix):
+    """Записывает файл функцией write(path) и возвращает его путь.
+
+    Файл пишется под временным именем и переименовывается целиком, так
+    что шлюз никогда не отдаст недописанный файл.
+    """
+    purge_periodically()
+    os.makedirs(settings.SPOOL_ROOT, exist_ok=True)
+    path = os.path.join(settings.SPOOL_ROOT, uuid.uuid4().hex + suffix)
+    partial = path + '.part'
+    try:
+        write(partial)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
+
+
+def write_chunks(chunks):
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.writelines(chunks)
+    return write
+
+
+def deliver(path, filename, content_type):
+    """Ответ, отдающий файл из спула средствами шлюза."""
+    if settings.FILE_DELIVERY == 'python':
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=filename,
+            content_type=content_type
+        )
+    response = HttpResponse(content_type=content_type)
+    if settings.FILE_DELIVERY == 'nginx':
+        response['X-Accel-Redirect'] = settings.SPOOL_URL + quote(
+            os.path.relpath(path, settings.SPOOL_ROOT)
+        )
+    else:
+        response['X-Sendfile'] = path
+    response['Content-Disposition'] = content_disposition(filename)
+    return response
+
+
+def deliver_chunks(chunks, filename, content_type):
+    """Выгрузка из генератора строк.
+
+    Без шлюза строки отдаются потоком напрямую; со шлюзом воркер быстро
+    пишет их в спул и освобождается, не дожидаясь медленного клиента.
+    """
+    if settings.FILE_DELIVERY == 'python':
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = content_disposition(filename)
+        return response
+    suffix = os.path.splitext(filename)[1]
+    return deliver(
+        spool(write_chunks(chunks), suffix), filename, content_type
+    )
@@ -0,0 +1,145 @@
+"""Потоковые выгрузки: список покупок и архив рецептов автора.
+
+Строки читаются через iterator(chunk_size=...) и сразу кодируются
+генераторами, так что память процесса не растёт с размером выгрузки.
+Мелкие строки склеиваются в куски по EXPORT_BUFFER_SIZE, чтобы сервер не
+отправлял клиенту по записи на каждую строку. Готовые куски отдаются через
+delivery: потоком или через спул шлюза.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db.models import prefetch_related_objects
+
+from foodgram_backend.constants import EXPORT_BUFFER_SIZE, EXPORT_CHUNK_SIZE
+
+from .delivery import deliver_chunks
+
+
+class Echo:
+    """Псевдофайл для csv.writer: write() возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def buffered(chunks, size=EXPORT_BUFFER_SIZE):
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def json_array(items):
+    yield '['
+    separator = ''
+    for item in items:
+        yield separator + json.dumps(item, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+def ndjson(items):
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+def shopping_list_rows(queryset):
+    """(название, количество, единица) позиций списка покупок."""
+    return queryset.values_list(
+        'ingredient__name', 'amount', 'ingredient__measurement_unit'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def shopping_list_txt(rows):
+    yield 'Список покупок\n\n'
+    for name, amount, measurement_unit in rows:
+        yield f'{name} - {amount} {measurement_unit}\n'
+
+
+def shopping_list_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def shopping_list_json(rows):
+    return json_array(
+        {'name': name, 'amount': amount, 'measurement_unit': measurement_unit}
+        for name, amount, measurement_unit in rows
+    )
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (shopping_list_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_list_csv, 'text/csv; charset=utf-8'),
+    'json': (shopping_list_json, 'application/json'),
+}
+
+
+def recipe_records(queryset, request):
+    """Рецепты со связями; связи подгружаются на каждую пачку рецептов."""
+    recipes = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for batch in batches(recipes, EXPORT_CHUNK_SIZE):
+        prefetch_related_objects(
+            batch, 'tags', 'recipe_recipeingredient__ingredient'
+        )
+        for recipe in batch:
+            yield {
+                'id': recipe.id,
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': (
+                    request.build_absolute_uri(recipe.image.url)
+                    if recipe.image else None
+                ),
+                'tags': [tag.slug for tag in recipe.tags.all()],
+                'ingredients': [
+                    {
+                        'id': link.ingredient_id,
+                        'name': link.ingredient.name,
+                        'measurement_unit': link.ingredient.measurement_unit,
+                        'amount': link.amount,
+                    }
+                    for link in recipe.recipe_recipeingredient.all()
+                ],
+                'updated_at': recipe.updated_at.isoformat(),
+            }
+
+
+def export_shopping_list(queryset, file_format):
+    render, content_type = SHOPPING_LIST_FORMATS[file_format]
+    return streaming_response(
+        render(shopping_list_rows(queryset)), content_type,
+        f'shopping_cart.{file_format}'
+    )
+
+
+def export_recipes(queryset, request, filename):
+    return streaming_response(
+        ndjson(recipe_records(queryset, request)),
+        'application/x-ndjson', filename
+    )
+
+
+def streaming_response(chunks, content_type, filename):
+    return deliver_chunks(buffered(chunks), filename, content_type)
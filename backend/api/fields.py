@@ -1,8 +1,12 @@
 import base64
 
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
 
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
+
+from foodgram_backend.storage import file_digest
 
 
 class Base64ImageField(serializers.ImageField):
@@ -14,3 +18,88 @@ class Base64ImageField(serializers.ImageField):
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
 
         return super().to_internal_value(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Первичный ключ, объекты для которого загружаются пачкой.
+
+    Перед валидацией списка значений вызывается resolve(), который
+    загружает все объекты одним in_bulk; сообщения об ошибках
+    совпадают с PrimaryKeyRelatedField. Если объекты уже загружены
+    снаружи (пакетный импорт), повторная загрузка не выполняется.
+    """
+
+    def __init__(self, **kwargs):
+        self.resolved = None
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            raise TypeError
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except ValidationError:
+            raise ValueError
+
+    def resolve(self, values):
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except (TypeError, ValueError, serializers.ValidationError):
+                continue
+        self.resolved = self.get_queryset().in_bulk(pks) if pks else {}
+
+    def release(self):
+        self.resolved = None
+
+    def to_internal_value(self, data):
+        if self.resolved is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.resolved:
+            self.fail('does_not_exist', pk_value=data)
+        return self.resolved[pk]
+
+
+class BulkManyRelatedField(ManyRelatedField):
+
+    def to_internal_value(self, data):
+        if (isinstance(data, str) or not hasattr(data, '__iter__')
+                or self.child_relation.resolved is not None):
+            return super().to_internal_value(data)
+        data = list(data)
+        self.child_relation.resolve(data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child_relation.release()
+
+
+def is_same_file(stored, upload):
+    """Проверяет, совпадает ли загруженный файл с уже сохранённым."""
+    if not stored:
+        return False
+    if hasattr(stored.storage, 'has_content'):
+        return stored.storage.has_content(stored.name, upload)
+    try:
+        if stored.size != upload.size:
+            return False
+        with stored.storage.open(stored.name, 'rb') as fh:
+            stored_digest = file_digest(File(fh))
+    except (OSError, ValueError):
+        return False
+    return stored_digest == file_digest(upload)
@@ -1,8 +1,16 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 import django_filters
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Ingredient, Recipe
+from recipes import popularity
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+from . import ingredient_index
 
 User = get_user_model()
 
@@ -15,6 +23,10 @@ class IngredientFilter(django_filters.FilterSet):
         fields = ('name',)
 
 
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
 class RecipeFilter(django_filters.FilterSet):
     tags = django_filters.AllValuesMultipleFilter(
         field_name='tags__slug',
@@ -26,10 +38,79 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.NumberFilter(
         method='filter'
     )
+    ordering = django_filters.ChoiceFilter(
+        choices=(('popular', 'popular'),),
+        method='filter_ordering'
+    )
+    ingredients = NumberInFilter(method='filter_ingredients')
+    match = django_filters.ChoiceFilter(
+        choices=(('all', 'all'), ('any', 'any'), ('have', 'have')),
+        method='filter_options'
+    )
+    missing = django_filters.NumberFilter(
+        min_value=0, method='filter_options'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering', 'ingredients', 'match', 'missing')
+
+    def search_ingredients(self, value):
+        """Поиск по ингредиентам через индекс в памяти.
+
+        match=all -- есть все ингредиенты, any -- хотя бы один,
+        have -- рецепту не хватает не больше missing ингредиентов
+        (при missing=0 рецепт готовится только из указанных).
+        Возвращает отсортированный массив id рецептов.
+        """
+        return ingredient_index.search(
+            self.form.cleaned_data.get('match') or 'all',
+            [int(pk) for pk in value],
+            int(self.form.cleaned_data.get('missing') or 0)
+        )
+
+    def filter_ingredients(self, queryset, name, value):
+        # Без других фильтров список отдаётся по результату индекса
+        # (RecipeViewSet.list), сюда поиск попадает вместе с ними.
+        if not value:
+            return queryset
+        found = self.search_ingredients(value)
+        if len(found) <= settings.INGREDIENT_SEARCH_MAX_IDS:
+            return queryset.filter(id__in=found.tolist())
+        # Длинный список id дороже соединения с составом рецептов.
+        return self.join_ingredients(queryset, [int(pk) for pk in value])
+
+    def join_ingredients(self, queryset, ingredient_ids):
+        match = self.form.cleaned_data.get('match') or 'all'
+        links = RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        if match == 'all':
+            for ingredient_id in set(ingredient_ids):
+                queryset = queryset.filter(
+                    Exists(links.filter(ingredient_id=ingredient_id))
+                )
+            return queryset
+        queryset = queryset.filter(
+            Exists(links.filter(ingredient_id__in=ingredient_ids))
+        )
+        if match == 'any':
+            return queryset
+        others = links.exclude(ingredient_id__in=ingredient_ids).order_by(
+        ).values('recipe').annotate(count=Count('id')).values('count')
+        return queryset.alias(
+            missing_ingredients=Coalesce(Subquery(others), 0)
+        ).filter(
+            missing_ingredients__lte=int(
+                self.form.cleaned_data.get('missing') or 0
+            )
+        )
+
+    def filter_options(self, queryset, name, value):
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        # Без других фильтров страницы берутся из popularity.Ranking.
+        return popularity.ordered(queryset)
 
     def filter(self, queryset, name, value):
         if not self.request.user.is_authenticated:
@@ -44,3 +125,28 @@ class RecipeFilter(django_filters.FilterSet):
             )
         else:
             return queryset
+
+
+class UsernamePrefixFilter(BaseFilterBackend):
+    """Поиск пользователей по началу username без учёта регистра.
+
+    Сравнение идёт с индексированным username_search. В PostgreSQL
+    LIKE 'префикс%' использует индекс с text_pattern_ops, SQLite применяет
+    индекс только к диапазону, поэтому для него добавляются границы.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(
+            self.search_param, ''
+        ).strip().casefold()
+        if not term:
+            return queryset
+        queryset = queryset.filter(username_search__startswith=term)
+        if (connections[queryset.db].vendor == 'sqlite'
+                and ord(term[-1]) < 0x10FFFF):
+            queryset = queryset.filter(
+                username_search__gte=term,
+                username_search__lt=term[:-1] + chr(ord(term[-1]) + 1)
+            )
+        return queryset
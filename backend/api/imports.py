@@ -0,0 +1,162 @@
+"""Пакетный импорт рецептов из NDJSON.
+
+Каждая строка -- тело запроса POST /api/recipes/. Строки читаются потоком
+и обрабатываются пачками по IMPORT_BATCH_SIZE: теги и ингредиенты пачки
+загружаются двумя запросами, уникальность названий проверяется одним
+запросом IN, изображения проверяются и сохраняются в пуле потоков, а
+рецепты и их связи записываются bulk_create в одной транзакции на пачку.
+bulk_create не отправляет сигналы, поэтому ленты подписчиков, кеши,
+журнал изменений, похожие рецепты и соседи ингредиентов обновляются здесь
+же.
+"""
+import binascii
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from rest_framework import serializers
+
+from foodgram_backend.routers import use_primary
+from recipes import cooccurrence, feed, similarity
+from recipes.models import Recipe, RecipeChange, RecipeIngredient, RecipeTag
+
+from .cache import bump_generation
+from .exports import batches
+from .fields import Base64ImageField
+from .serializers import RecipeImportSerializer
+
+NAME_TAKEN = 'Рецепт с таким названием уже существует.'
+
+
+def save_image(data):
+    """Проверяет и сохраняет изображение: (имя файла, None) или ошибки."""
+    try:
+        upload = Base64ImageField().run_validation(data)
+    except serializers.ValidationError as error:
+        return None, {'image': error.detail}
+    except ValidationError as error:
+        return None, {'image': error.messages}
+    except (ValueError, binascii.Error):
+        return None, {'image': ['Некорректное изображение.']}
+    field = Recipe._meta.get_field('image')
+    name = field.generate_filename(None, upload.name)
+    return field.storage.save(name, upload), None
+
+
+def validate(batch):
+    """Разбирает и проверяет строки пачки: (рецепты, ошибки по строкам)."""
+    errors = {}
+    records = []
+    for number, line in batch:
+        if not line.strip():
+            continue
+        try:
+            records.append((number, json.loads(line)))
+        except ValueError:
+            errors[number] = {'non_field_errors': ['Строка не является JSON.']}
+    serializer = RecipeImportSerializer(many=True)
+    results = serializer.validate_items([data for _, data in records])
+    valid = []
+    for (number, _), (data, error) in zip(records, results):
+        if error:
+            errors[number] = error
+        else:
+            valid.append((number, data))
+    taken = set(Recipe.objects.filter(
+        name__in=[data['name'] for _, data in valid]
+    ).values_list('name', flat=True))
+    unique = []
+    for number, data in valid:
+        if data['name'] in taken:
+            errors[number] = {'name': [NAME_TAKEN]}
+        else:
+            taken.add(data['name'])
+            unique.append((number, data))
+    return unique, errors
+
+
+def create(records, author):
+    """Записывает проверенные рецепты пачки одной транзакцией."""
+    recipes = [
+        Recipe(author=author, name=data['name'], text=data['text'],
+               cooking_time=data['cooking_time'], image=data['image'])
+        for _, data in records
+    ]
+    with transaction.atomic():
+        Recipe.objects.bulk_create(recipes)
+        # SQLite не возвращает id из bulk_create, названия уникальны.
+        ids = dict(Recipe.objects.filter(
+            name__in=[recipe.name for recipe in recipes]
+        ).values_list('name', 'id'))
+        for recipe in recipes:
+            recipe.pk = ids[recipe.name]
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe, (_, data) in zip(recipes, records)
+            for tag in data['tags']
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=item['id'],
+                             amount=item['amount'])
+            for recipe, (_, data) in zip(recipes, records)
+            for item in sorted(
+                data['ingredients'], key=lambda item: item['id'].name
+            )
+        )
+        RecipeChange.record(*(recipe.pk for recipe in recipes))
+    return recipes
+
+
+def import_batch(batch, author, pool):
+    """Импортирует пачку строк; отчёт -- словарь номер строки -> результат."""
+    records, errors = validate(batch)
+    images = pool.map(save_image, [data['image'] for _, data in records])
+    stored = []
+    for (number, data), (name, error) in zip(records, images):
+        if error:
+            errors[number] = error
+        else:
+            data['image'] = name
+            stored.append((number, data))
+    report = {number: {'errors': error} for number, error in errors.items()}
+    if not stored:
+        return report, set()
+    try:
+        recipes = create(stored, author)
+    except IntegrityError:
+        # Файлы адресуются по содержимому и могут принадлежать другим
+        # рецептам; ненужные удалит collect_orphan_images.
+        for number, _ in stored:
+            report[number] = {'errors': {'non_field_errors': [
+                'Не удалось сохранить рецепт, повторите импорт строки.'
+            ]}}
+        return report, set()
+    for recipe, (number, _) in zip(recipes, stored):
+        feed.fan_out(recipe)
+        report[number] = {'id': recipe.pk}
+    similarity.refresh_many(recipe.pk for recipe in recipes)
+    bump_generation('recipes')
+    bump_generation('ingredient_index')
+    return report, {
+        item['id'].id for _, data in stored for item in data['ingredients']
+    }
+
+
+def import_recipes(lines, author):
+    """Импортирует рецепты из строк NDJSON, отдаёт результат каждой строки."""
+    ingredient_ids = set()
+    with use_primary(), ThreadPoolExecutor(
+        max_workers=settings.IMPORT_IMAGE_WORKERS
+    ) as pool:
+        for batch in batches(enumerate(lines, 1), settings.IMPORT_BATCH_SIZE):
+            report, used = import_batch(batch, author, pool)
+            ingredient_ids |= used
+            for number in sorted(report):
+                yield {'line': number, **report[number]}
+        # Соседи ингредиентов пересчитываются один раз на весь импорт.
+        if ingredient_ids:
+            cooccurrence.refresh(ingredient_ids)
+            bump_generation('ingredient_suggestions')
@@ -0,0 +1,178 @@
+"""Инвертированный индекс ингредиент -> рецепты в памяти процесса.
+
+Для каждого ингредиента хранится отсортированный массив id рецептов, для
+каждого рецепта -- число его ингредиентов. Изменения рецептов повышают
+поколение 'ingredient_index' в общем кеше; заметив новое поколение,
+процесс дочитывает рецепты с updated_at позже последней синхронизации
+и убирает удалённые по отметкам об удалении в RecipeChange.
+"""
+import threading
+from datetime import timedelta
+
+from django.utils import timezone
+
+from foodgram_backend.lazy import LazyModule
+from recipes.models import Recipe, RecipeChange, RecipeIngredient
+
+from . import invalidation
+
+np = LazyModule('numpy')
+
+# Запас на транзакции, закоммиченные позже своего updated_at.
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def empty():
+    return np.empty(0, dtype=np.int64)
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.recipe_ingredients = {}
+        self.sizes = None
+        self.generation = None
+        self.synced_at = None
+
+    def rebuild(self):
+        postings = {}
+        recipe_ingredients = {}
+        synced_at = timezone.now()
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator(chunk_size=10000):
+            postings.setdefault(ingredient_id, []).append(recipe_id)
+            recipe_ingredients.setdefault(recipe_id, []).append(
+                ingredient_id
+            )
+        self.postings = {
+            ingredient_id: np.array(recipe_ids, dtype=np.int64)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self.recipe_ingredients = {
+            recipe_id: np.array(ingredient_ids, dtype=np.int64)
+            for recipe_id, ingredient_ids in recipe_ingredients.items()
+        }
+        self.sizes = np.zeros(
+            max(recipe_ingredients, default=0) + 1, dtype=np.int32
+        )
+        for recipe_id, ingredient_ids in self.recipe_ingredients.items():
+            self.sizes[recipe_id] = len(ingredient_ids)
+        self.synced_at = synced_at
+
+    def replace(self, recipe_id, ingredient_ids):
+        """Заменяет состав одного рецепта в индексе."""
+        for ingredient_id in self.recipe_ingredients.pop(recipe_id, empty()):
+            posting = self.postings[int(ingredient_id)]
+            self.postings[int(ingredient_id)] = posting[posting != recipe_id]
+        if recipe_id >= len(self.sizes):
+            self.sizes = np.concatenate([
+                self.sizes,
+                np.zeros(recipe_id + 1 - len(self.sizes), dtype=np.int32)
+            ])
+        self.sizes[recipe_id] = len(ingredient_ids)
+        if not ingredient_ids:
+            return
+        self.recipe_ingredients[recipe_id] = np.array(
+            ingredient_ids, dtype=np.int64
+        )
+        for ingredient_id in ingredient_ids:
+            posting = self.postings.get(ingredient_id, empty())
+            position = np.searchsorted(posting, recipe_id)
+            self.postings[ingredient_id] = np.insert(
+                posting, position, recipe_id
+            )
+
+    def catch_up(self):
+        synced_at = timezone.now()
+        since = self.synced_at - SYNC_OVERLAP
+        changed = list(Recipe.objects.filter(
+            updated_at__gte=since
+        ).values_list('id', flat=True))
+        # Удалённые рецепты получают пустой состав.
+        compositions = {
+            recipe_id: [] for recipe_id in RecipeChange.objects.filter(
+                deleted=True, created_at__gte=since
+            ).values_list('recipe_id', flat=True)
+        }
+        compositions.update((recipe_id, []) for recipe_id in changed)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=changed
+        ).values_list('recipe_id', 'ingredient_id'):
+            compositions[recipe_id].append(ingredient_id)
+        for recipe_id, ingredient_ids in compositions.items():
+            self.replace(recipe_id, ingredient_ids)
+        self.synced_at = synced_at
+
+    def sync(self):
+        """Приводит индекс в соответствие с базой, если она менялась."""
+        generation = invalidation.version('ingredient_index')
+        if generation == self.generation:
+            return
+        with self.lock:
+            if generation == self.generation:
+                return
+            if self.synced_at is None:
+                self.rebuild()
+            else:
+                self.catch_up()
+            self.generation = generation
+
+    def get_postings(self, ingredient_ids):
+        return [
+            self.postings.get(ingredient_id, empty())
+            for ingredient_id in set(ingredient_ids)
+        ]
+
+    def all_of(self, ingredient_ids):
+        """Рецепты, в которых есть все указанные ингредиенты."""
+        postings = sorted(self.get_postings(ingredient_ids), key=len)
+        if not postings:
+            return empty()
+        result = postings[0]
+        for posting in postings[1:]:
+            present = np.zeros(len(self.sizes), dtype=bool)
+            present[posting] = True
+            result = result[present[result]]
+        return result
+
+    def any_of(self, ingredient_ids):
+        """Рецепты хотя бы с одним из указанных ингредиентов."""
+        postings = self.get_postings(ingredient_ids)
+        if not postings:
+            return empty()
+        found = np.zeros(len(self.sizes), dtype=bool)
+        for posting in postings:
+            found[posting] = True
+        return np.flatnonzero(found)
+
+    def missing_at_most(self, ingredient_ids, missing):
+        """Рецепты, которым не хватает не больше missing ингредиентов."""
+        postings = self.get_postings(ingredient_ids)
+        if not postings:
+            return empty()
+        matched = np.bincount(
+            np.concatenate(postings), minlength=len(self.sizes)
+        )
+        return np.flatnonzero(
+            (matched > 0) & (self.sizes - matched <= missing)
+        )
+
+
+index = IngredientIndex()
+invalidation.register('ingredient_index')
+
+
+def search(match, ingredient_ids, missing=0):
+    """Отсортированный массив id рецептов по ингредиентам: all, any, have."""
+    index.sync()
+    if match == 'all':
+        result = index.all_of(ingredient_ids)
+    elif match == 'any':
+        result = index.any_of(ingredient_ids)
+    else:
+        result = index.missing_at_most(ingredient_ids, missing)
+    return result
@@ -0,0 +1,124 @@
+"""Подсказки ингредиентов для редактора рецепта из памяти процесса.
+
+Списки соседей всех ингредиентов и сами ингредиенты загружаются из базы
+целиком: их немного, а подсказку запрашивают на каждое добавление
+ингредиента. Пересчёт соседей и изменения ингредиентов повышают
+поколение 'ingredient_suggestions'; до окончания перезагрузки остальные
+потоки отвечают по прежним данным.
+"""
+import threading
+
+from foodgram_backend.constants import SUGGESTED_INGREDIENTS
+from foodgram_backend.lazy import LazyModule
+from recipes import cooccurrence
+from recipes.models import Ingredient, IngredientNeighbour, RecipeIngredient
+
+from . import invalidation
+from .cache import bump_generation
+
+np = LazyModule('numpy')
+
+
+class IngredientSuggestions:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.neighbours = None
+        self.ingredients = {}
+        self.generation = None
+
+    def load(self):
+        ingredients = {
+            item['id']: item
+            for item in Ingredient.objects.values(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        }
+        lists = {}
+        for ingredient_id, neighbour_id, score in (
+            IngredientNeighbour.objects.order_by(
+                'ingredient_id', '-score'
+            ).values_list(
+                'ingredient_id', 'neighbour_id', 'score'
+            ).iterator(chunk_size=10000)
+        ):
+            lists.setdefault(ingredient_id, []).append((neighbour_id, score))
+        neighbours = {}
+        for ingredient_id, rows in lists.items():
+            neighbour_ids, scores = zip(*rows)
+            neighbours[ingredient_id] = (
+                np.array(neighbour_ids, dtype=np.int64),
+                np.array(scores, dtype=np.float64),
+            )
+        self.neighbours, self.ingredients = neighbours, ingredients
+
+    def sync(self):
+        generation = invalidation.version('ingredient_suggestions')
+        if generation == self.generation:
+            return
+        # Первая загрузка ждёт блокировку, дальше пересчёт делает один поток.
+        if not self.lock.acquire(blocking=self.neighbours is None):
+            return
+        try:
+            if generation != self.generation:
+                self.load()
+                self.generation = generation
+        finally:
+            self.lock.release()
+
+    def suggest(self, ingredient_ids, limit=SUGGESTED_INGREDIENTS):
+        """Ингредиенты, чаще всего встречающиеся вместе с выбранными."""
+        chosen = set(ingredient_ids)
+        lists = [
+            self.neighbours[ingredient_id]
+            for ingredient_id in chosen if ingredient_id in self.neighbours
+        ]
+        if not lists:
+            return []
+        candidates, positions = np.unique(
+            np.concatenate([ids for ids, _ in lists]), return_inverse=True
+        )
+        scores = np.bincount(
+            positions, weights=np.concatenate([values for _, values in lists])
+        )
+        scores[np.isin(candidates, list(chosen))] = -1
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [
+            self.ingredients[pk]
+            for pk in candidates[order[scores[order] > 0]].tolist()
+            if pk in self.ingredients
+        ]
+
+
+suggestions = IngredientSuggestions()
+invalidation.register('ingredient_suggestions')
+
+
+def suggest(ingredient_ids, limit=SUGGESTED_INGREDIENTS):
+    suggestions.sync()
+    return suggestions.suggest(ingredient_ids, limit)
+
+
+def rebuild():
+    """Полный пересчёт соседей; возвращает число сохранённых пар."""
+    rows = cooccurrence.build()
+    bump_generation('ingredient_suggestions')
+    return rows
+
+
+def refresh(changes):
+    """Пересчёт соседей ингредиентов рецептов, в том числе удалённых из них.
+
+    changes -- пары (id рецепта, id ингредиента изменённой строки или None).
+    """
+    recipe_ids = {recipe_id for recipe_id, _ in changes}
+    ingredient_ids = {
+        ingredient_id for _, ingredient_id in changes
+        if ingredient_id is not None
+    }
+    cooccurrence.refresh(ingredient_ids | set(
+        RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', flat=True)
+    ))
+    bump_generation('ingredient_suggestions')
@@ -0,0 +1,58 @@
+"""Сброс кешей в памяти процессов при изменении данных.
+
+Сигналы моделей повышают поколения пространств имён в общем кеше
+(bump_generation). В начале каждого запроса процесс одним get_many
+читает поколения всех отслеживаемых пространств и вызывает
+обработчики тех, что изменились, -- так изменение в одном воркере,
+админке или команде manage.py сбрасывает локальные кеши всех воркеров
+до обработки следующего запроса.
+"""
+import threading
+
+from django.core.cache import cache
+
+from .cache import generation_key, get_generation
+
+handlers = {}
+versions = {}
+lock = threading.Lock()
+
+
+def register(namespace, handler=None):
+    """Отслеживать namespace и вызывать handler() при смене поколения.
+
+    Без handler поколение только читается в начале запроса, и version()
+    отдаёт его без отдельного обращения к кешу.
+    """
+    namespace_handlers = handlers.setdefault(namespace, [])
+    if handler is not None:
+        namespace_handlers.append(handler)
+
+
+def check():
+    """Читает поколения одним запросом и сбрасывает устаревшие кеши."""
+    if not handlers:
+        return
+    keys = {generation_key(namespace): namespace for namespace in handlers}
+    values = cache.get_many(keys)
+    changed = []
+    with lock:
+        for key, namespace in keys.items():
+            generation = values.get(key)
+            if generation is None:
+                generation = get_generation(namespace)
+            previous = versions.get(namespace)
+            versions[namespace] = generation
+            if previous is not None and previous != generation:
+                changed.append(namespace)
+    for namespace in changed:
+        for handler in handlers[namespace]:
+            handler()
+
+
+def version(namespace):
+    """Поколение на момент последней проверки, без обращения к кешу."""
+    generation = versions.get(namespace)
+    if generation is None:
+        return get_generation(namespace)
+    return generation
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodgram_backend.db import apply_sqlite_pragmas
+
+
+def run_worker(path, pragmas, seconds, write_ratio, persistent, queue):
+    """Смешанная нагрузка чтение/запись одного воркера."""
+    reads = writes = errors = 0
+    connection = None
+    deadline = time.monotonic() + seconds
+    step = 0
+    while time.monotonic() < deadline:
+        step += 1
+        if connection is None:
+            connection = sqlite3.connect(
+                path, timeout=settings.SQLITE_PRAGMAS['busy_timeout'] / 1000,
+                isolation_level=None
+            )
+            apply_sqlite_pragmas(connection.cursor(), pragmas)
+        try:
+            if step % 100 < write_ratio:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute(
+                    'INSERT INTO bench (payload) VALUES (?)', ('x' * 200,)
+                )
+                connection.execute('COMMIT')
+                writes += 1
+            else:
+                connection.execute(
+                    'SELECT id, payload FROM bench ORDER BY id DESC LIMIT 20'
+                ).fetchall()
+                reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+        if not persistent:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+    queue.put((reads, writes, errors))
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест SQLite: режим журнала по умолчанию '
+            'против WAL из SQLITE_PRAGMAS при нескольких воркерах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--write-ratio', type=int, default=10,
+            help='Процент запросов на запись.'
+        )
+        parser.add_argument(
+            '--reconnect', action='store_true',
+            help='Открывать соединение на каждый запрос (CONN_MAX_AGE=0).'
+        )
+
+    def handle(self, *args, **options):
+        modes = {
+            'rollback-journal': {},
+            'wal': settings.SQLITE_PRAGMAS,
+        }
+        for mode, pragmas in modes.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                with sqlite3.connect(path) as connection:
+                    connection.execute(
+                        'CREATE TABLE bench (id INTEGER PRIMARY KEY, '
+                        'payload TEXT NOT NULL)'
+                    )
+                queue = multiprocessing.Queue()
+                processes = [
+                    multiprocessing.Process(
+                        target=run_worker,
+                        args=(path, pragmas, options['seconds'],
+                              options['write_ratio'],
+                              not options['reconnect'], queue)
+                    )
+                    for _ in range(options['workers'])
+                ]
+                for process in processes:
+                    process.start()
+                results = [queue.get() for _ in processes]
+                for process in processes:
+                    process.join()
+            reads = sum(result[0] for result in results)
+            writes = sum(result[1] for result in results)
+            errors = sum(result[2] for result in results)
+            self.stdout.write(
+                f'{mode:>16}: {reads / options["seconds"]:>10.0f} чтений/с '
+                f'{writes / options["seconds"]:>8.0f} записей/с '
+                f'ошибок: {errors}'
+            )
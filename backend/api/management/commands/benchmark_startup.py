@@ -0,0 +1,88 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Импорт приложения, как его выполняет воркер gunicorn.
+STARTUP = (
+    'import django; django.setup(); '
+    'import foodgram_backend.wsgi, foodgram_backend.urls'
+)
+# Модули, которые должны загружаться только при первом использовании.
+LAZY_MODULES = ('numpy', 'scipy', 'reportlab')
+
+
+def parse_importtime(output):
+    """{модуль верхнего уровня: накопленное время, мкс} и все модули."""
+    top_level = {}
+    modules = set()
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        if not name.startswith('  '):
+            top_level[name.strip()] = int(cumulative)
+    return top_level, modules
+
+
+class Command(BaseCommand):
+    help = ('Время холодного импорта приложения (python -X importtime); '
+            'завершается ошибкой при превышении бюджета')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget', type=int, default=700,
+            help='Допустимое время импорта, мс.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Число запусков, берётся лучший.'
+        )
+        parser.add_argument('--top', type=int, default=10)
+
+    def measure(self):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+        }
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        runs = [self.measure() for _ in range(options['repeat'])]
+        top_level, modules = min(
+            runs, key=lambda run: sum(run[0].values())
+        )
+        total = sum(top_level.values()) / 1000
+        heaviest = sorted(
+            top_level.items(), key=lambda item: item[1], reverse=True
+        )
+        for name, cumulative in heaviest[:options['top']]:
+            self.stdout.write(f'{cumulative / 1000:8.1f} мс  {name}')
+        self.stdout.write(
+            f'Импорт приложения: {total:.1f} мс '
+            f'(бюджет {options["budget"]} мс).'
+        )
+        eager = sorted(
+            name for name in modules
+            if name.split('.')[0] in LAZY_MODULES
+        )
+        if eager:
+            raise CommandError(
+                'При запуске импортируются модули, которые должны '
+                'загружаться лениво: ' + ', '.join(eager[:5])
+            )
+        if total > options['budget']:
+            raise CommandError(
+                f'Импорт приложения дольше бюджета: {total:.1f} мс.'
+            )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import ingredient_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт ингредиентов, часто встречающихся вместе'
+
+    def handle(self, *args, **kwargs):
+        rows = ingredient_suggestions.rebuild()
+        self.stdout.write(f'Сохранено пар соседних ингредиентов: {rows}.')
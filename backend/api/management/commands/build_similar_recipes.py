@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes import similarity
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт похожих рецептов по составу ингредиентов'
+
+    def handle(self, *args, **kwargs):
+        rows = similarity.build()
+        self.stdout.write(f'Сохранено пар похожих рецептов: {rows}.')
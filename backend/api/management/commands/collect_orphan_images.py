@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f'{path}/{name}'
+    for directory in directories:
+        yield from walk(storage, f'{path}/{directory}')
+
+
+class Command(BaseCommand):
+    help = 'Удаление изображений, на которые не ссылается ни один рецепт'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=24,
+            help='Не трогать файлы моложе стольких часов: они могут '
+                 'принадлежать незавершённой загрузке.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        root = field.upload_to.rstrip('/')
+        if not storage.exists(root):
+            self.stdout.write('Изображений нет.')
+            return
+        # Файлы перечисляются раньше ссылок, а повторная загрузка файла
+        # обновляет дату его изменения: молодые файлы не удаляются.
+        files = list(walk(storage, root))
+        referenced = set(
+            Recipe.objects.values_list('image', flat=True).iterator()
+        )
+        deadline = timezone.now() - timedelta(hours=options['min_age'])
+        removed = 0
+        for name in files:
+            if name in referenced or storage.get_modified_time(
+                name
+            ) > deadline:
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+            removed += 1
+        self.stdout.write(f'Изображений без рецептов: {removed}.')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes import changes
+
+
+class Command(BaseCommand):
+    help = 'Сжатие журнала изменений рецептов до последней записи на рецепт'
+
+    def handle(self, *args, **options):
+        removed = changes.compact()
+        self.stdout.write(f'Записей журнала удалено: {removed}.')
@@ -0,0 +1,37 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import import_recipes
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Импорт рецептов из файла NDJSON: строка -- тело POST /api/recipes/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON.')
+        parser.add_argument(
+            '--author', required=True,
+            help='Имя пользователя или email автора рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(
+            username=options['author']
+        ).first() or User.objects.filter(email=options['author']).first()
+        if author is None:
+            raise CommandError(f'Пользователь {options["author"]} не найден.')
+        created = failed = 0
+        with open(options['path'], encoding='utf-8') as fh:
+            for result in import_recipes(fh, author):
+                if 'errors' in result:
+                    failed += 1
+                    self.stderr.write(json.dumps(result, ensure_ascii=False))
+                else:
+                    created += 1
+        self.stdout.write(
+            f'Импортировано рецептов: {created}, строк с ошибками: {failed}.'
+        )
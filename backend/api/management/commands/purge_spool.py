@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import delivery
+
+
+class Command(BaseCommand):
+    help = 'Удаление устаревших сгенерированных файлов из SPOOL_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=settings.SPOOL_MAX_AGE,
+            help='Удалять файлы старше стольких секунд.'
+        )
+
+    def handle(self, *args, **options):
+        removed = delivery.purge(options['max_age'])
+        self.stdout.write(f'Файлов удалено: {removed}.')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт списков покупок по рецептам в корзинах'
+
+    def handle(self, *args, **kwargs):
+        rows = shopping_list.rebuild()
+        self.stdout.write(f'Сохранено позиций списков покупок: {rows}.')
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from recipes import feed
+from recipes.models import FeedEntry
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Обрезка лент рецептов до FEED_MAX_LENGTH записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Перед обрезкой заново заполнить ленты по подпискам.'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            follows = Follow.objects.values_list('user_id', 'following_id')
+            for user_id, author_id in follows.iterator():
+                feed.backfill(user_id, author_id)
+            self.stdout.write(f'Подписок обработано: {follows.count()}.')
+
+        users = FeedEntry.objects.values('user_id').annotate(
+            entries=Count('id')
+        ).filter(entries__gt=settings.FEED_MAX_LENGTH)
+        for row in users.iterator():
+            feed.trim(row['user_id'])
+        self.stdout.write(f'Лент обрезано: {users.count()}.')
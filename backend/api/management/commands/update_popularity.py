@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_generation
+from recipes import popularity
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт недельных и суточных рейтингов рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать и счётчик за всё время.'
+        )
+
+    def handle(self, *args, **options):
+        updated = popularity.compact(full=options['full'])
+        bump_generation('popularity')
+        bump_generation('recipes')
+        self.stdout.write(f'Рейтинги пересчитаны для {updated} рецептов.')
@@ -1,4 +1,10 @@
+from collections import OrderedDict
+
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 from foodgram_backend.constants import MAX_PAGE_SIZE
 
@@ -7,3 +13,59 @@ class CustomPagination(pagination.PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = MAX_PAGE_SIZE
     page_query_param = 'page'
+
+
+class FeedCursorPagination:
+    """Курсор по id рецепта: страница содержит рецепты с меньшими id."""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            return int(cursor)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_paginated_response(self, request, ids, page_size, data):
+        next_link = None
+        if len(ids) == page_size:
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param, ids[-1]
+            )
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('results', data),
+        ]))
+
+
+class ChangesCursorPagination(FeedCursorPagination):
+    """Курсор по токену журнала изменений: страница -- записи после него."""
+    cursor_query_param = 'since'
+
+    def get_paginated_response(self, request, changes, page_size, data,
+                               deleted):
+        since = changes[-1].id if changes else self.get_cursor(request)
+        next_link = None
+        if len(changes) == page_size:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), self.cursor_query_param, since
+            )
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('since', since or 0),
+            ('results', data),
+            ('deleted', deleted),
+        ]))
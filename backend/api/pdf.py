@@ -0,0 +1,61 @@
+"""PDF списка покупок.
+
+reportlab и шрифт DejaVuSerif загружаются при первом документе, а не при
+импорте представлений: разбор TTF занимает заметную часть запуска
+воркера и не нужен командам manage.py. При preload_app gunicorn вызывает
+setup() в мастере, и воркеры получают готовый шрифт при fork.
+"""
+import threading
+
+from django.conf import settings
+
+FONT = 'DejaVuSerif'
+
+
+class ShoppingListRenderer:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.canvas = None
+
+    def setup(self):
+        if self.canvas is not None:
+            return
+        with self.lock:
+            if self.canvas is not None:
+                return
+            import reportlab.rl_config
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+            from reportlab.pdfgen import canvas
+
+            reportlab.rl_config.warnOnMissingFontGlyphs = 0
+            reportlab.rl_config.TTFSearchPath.append(
+                str(settings.BASE_DIR) + '/lib/reportlab/fonts'
+            )
+            pdfmetrics.registerFont(TTFont(FONT, 'DejaVuSerif.ttf', 'UTF-8'))
+            self.canvas = canvas
+
+    def render(self, path, rows):
+        """Пишет в path PDF из строк (название, количество, единица)."""
+        self.setup()
+        p = self.canvas.Canvas(path)
+        p.setFont(FONT, 16)
+        y = 700
+        p.drawString(100, y + 50, 'Список покупок')
+        p.setFont(FONT, 14)
+        for name, amount, measurement_unit in rows:
+            p.drawString(
+                100, y,
+                f'{name} - {amount} {measurement_unit}'
+            )
+            y -= 30
+        p.showPage()
+        p.save()
+
+
+renderer = ShoppingListRenderer()
+
+
+def render_shopping_list(path, rows):
+    renderer.render(path, rows)
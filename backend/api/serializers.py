@@ -1,13 +1,21 @@
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            RecipeTag, ShoppingCart, ShoppingListItem, Tag)
+from recipes.signals import composition_changed
 from users.models import Follow
 
-from .fields import Base64ImageField
+from .cache import fragment_cache_key, get_generation
+from .fields import Base64ImageField, BulkPrimaryKeyRelatedField, is_same_file
 
 User = get_user_model()
 
@@ -69,6 +77,9 @@ class UserGetSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        # UserViewSet аннотирует подписку в запросе списка.
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request')
         if user and user.user.is_authenticated:
             return user.user.follower.filter(following=obj).exists()
@@ -178,55 +189,136 @@ class RecipeGetIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """Часть рецепта, одинаковая для всех пользователей."""
     author = AuthorSerializer(required=False, read_only=True)
     tags = TagSerializer(many=True)
     ingredients = RecipeGetIngredientSerializer(
         source='recipe_recipeingredient', many=True
     )
-    is_favorited = serializers.SerializerMethodField(
-        'get_is_favorited', read_only=True,
-    )
-    is_in_shopping_cart = serializers.SerializerMethodField(
-        'get_is_in_shopping_cart', read_only=True,
-    )
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'tags', 'author', 'ingredients', 'image', 'name',
+                  'text', 'cooking_time')
+
+
+def represent_recipes(recipes, request=None):
+    """Собирает представления рецептов из кеша фрагментов.
+
+    Фрагменты берутся одним get_many, недостающие строятся по общему
+    prefetch и кладутся обратно; признаки избранного и корзины
+    запрашиваются двумя запросами на всю страницу.
+    """
+    recipes = list(recipes)
+    generation = get_generation('recipe_fragments')
+    keys = {
+        recipe.pk: fragment_cache_key(generation, recipe.pk)
+        for recipe in recipes
+    }
+    cached = cache.get_many(keys.values())
+    stamps = {recipe.pk: recipe.updated_at.isoformat() for recipe in recipes}
+    fragments = {}
+    for recipe in recipes:
+        stamp, fragment = cached.get(keys[recipe.pk], (None, None))
+        if stamp == stamps[recipe.pk]:
+            fragments[recipe.pk] = fragment
+    missing = [recipe for recipe in recipes if recipe.pk not in fragments]
+    if missing:
+        prefetch_related_objects(
+            missing, 'author', 'tags', 'recipe_recipeingredient__ingredient'
+        )
+        built = RecipeFragmentSerializer(missing, many=True).data
+        fragments.update(
+            (recipe.pk, fragment) for recipe, fragment in zip(missing, built)
+        )
+        cache.set_many(
+            {
+                keys[recipe.pk]: (stamps[recipe.pk], fragments[recipe.pk])
+                for recipe in missing
+            },
+            settings.RECIPE_FRAGMENT_CACHE_TIMEOUT
+        )
+
+    favorited = in_cart = set()
+    if request and request.user.is_authenticated:
+        ids = list(keys)
+        favorited = set(request.user.recipe_follower.filter(
+            recipe_id__in=ids
+        ).values_list('recipe_id', flat=True))
+        in_cart = set(request.user.shopping_cart.filter(
+            recipe_id__in=ids
+        ).values_list('recipe_id', flat=True))
+
+    result = []
+    for recipe in recipes:
+        data = OrderedDict(fragments[recipe.pk])
+        if request and data['image']:
+            data['image'] = request.build_absolute_uri(data['image'])
+        data['is_favorited'] = recipe.pk in favorited
+        data['is_in_shopping_cart'] = recipe.pk in in_cart
+        result.append(data)
+    return result
+
+
+class RecipeGetListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        return represent_recipes(data, self.context.get('request'))
+
+
+class RecipeGetSerializer(RecipeFragmentSerializer):
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'image', 'name',
                   'text', 'cooking_time', 'is_favorited',
                   'is_in_shopping_cart')
+        list_serializer_class = RecipeGetListSerializer
 
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.recipe_follower.filter(
-                recipe=obj
-            ).exists()
-        return False
+    def to_representation(self, instance):
+        return represent_recipes([instance], self.context.get('request'))[0]
 
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.shopping_cart.filter(
-                recipe=obj
-            ).exists()
-        return False
+
+class BulkResolveListSerializer(serializers.ListSerializer):
+    """Загружает связанные объекты всех элементов одним запросом."""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        bulk_fields = [
+            field for field in self.child.fields.values()
+            if isinstance(field, BulkPrimaryKeyRelatedField)
+            and field.resolved is None
+        ]
+        for field in bulk_fields:
+            field.resolve(
+                item[field.field_name] for item in data
+                if isinstance(item, dict) and field.field_name in item
+            )
+        try:
+            return super().to_internal_value(data)
+        finally:
+            for field in bulk_fields:
+                field.release()
 
 
 class IngredientPostFields(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
     )
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = BulkResolveListSerializer
 
 
 class RecipePostSerializer(serializers.ModelSerializer):
     author = AuthorSerializer(required=False, read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True, required=True
     )
@@ -242,9 +334,10 @@ class RecipePostSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         ingredients.sort(key=lambda lst: lst['id'].name)
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags, clear=False)
-        self.set_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags, clear=False)
+            self.set_ingredients(recipe, ingredients)
         return recipe
 
     def update(self, instance, validated_data):
@@ -256,23 +349,84 @@ class RecipePostSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Необходимо указать ингредиенты.'
             )
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        instance.image = validated_data.get('image', instance.image)
-
         tags = validated_data.pop('tags')
-        instance.tags.set(tags, clear=True)
-
         ingredients = validated_data.pop('ingredients')
-        ingredients.sort(key=lambda lst: lst['id'].name)
-        instance.ingredients.clear()
-        self.set_ingredients(instance, ingredients)
-        instance.save()
+        image = validated_data.pop('image', None)
+
+        update_fields = []
+        for field in ('name', 'text', 'cooking_time'):
+            if (field in validated_data
+                    and getattr(instance, field) != validated_data[field]):
+                setattr(instance, field, validated_data[field])
+                update_fields.append(field)
+        if image is not None and not is_same_file(instance.image, image):
+            instance.image = image
+            update_fields.append('image')
+
+        with transaction.atomic():
+            tags_changed = self.update_tags(instance, tags)
+            ingredients_changed = self.update_ingredients(
+                instance, ingredients
+            )
+            # updated_at -- основа ETag и Last-Modified, поэтому меняется
+            # при любой правке рецепта, а не только его связей.
+            if update_fields or tags_changed or ingredients_changed:
+                update_fields.append('updated_at')
+                instance.save(update_fields=update_fields)
+            if ingredients_changed:
+                composition_changed.send(
+                    sender=Recipe, instance=instance, created=False
+                )
         return instance
 
+    def update_tags(self, instance, tags):
+        incoming = {tag.id: tag for tag in tags}
+        stored = set()
+        stale = []
+        for pk, tag_id in instance.recipe_recipetag.values_list(
+            'id', 'tag_id'
+        ):
+            if tag_id in incoming and tag_id not in stored:
+                stored.add(tag_id)
+            else:
+                stale.append(pk)
+        if stale:
+            RecipeTag.objects.filter(id__in=stale).delete()
+        added = RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=instance, tag=tag)
+            for tag_id, tag in incoming.items() if tag_id not in stored
+        )
+        return bool(stale or added)
+
+    def update_ingredients(self, instance, lst):
+        incoming = {item['id'].id: item for item in lst}
+        stored = set()
+        stale = []
+        changed = []
+        for pk, ingredient_id, amount in (
+            instance.recipe_recipeingredient.values_list(
+                'id', 'ingredient_id', 'amount'
+            )
+        ):
+            if ingredient_id in incoming and ingredient_id not in stored:
+                stored.add(ingredient_id)
+                new_amount = incoming[ingredient_id]['amount']
+                if new_amount != amount:
+                    changed.append(RecipeIngredient(id=pk, amount=new_amount))
+            else:
+                stale.append(pk)
+        if stale:
+            RecipeIngredient.objects.filter(id__in=stale).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        added = [
+            item for ingredient_id, item in incoming.items()
+            if ingredient_id not in stored
+        ]
+        added.sort(key=lambda lst: lst['id'].name)
+        self.set_ingredients(instance, added)
+        return bool(stale or changed or added)
+
     def set_ingredients(self, instance, lst):
         objs = [
             RecipeIngredient(
@@ -313,6 +467,53 @@ class RecipePostSerializer(serializers.ModelSerializer):
         return value
 
 
+def related_values(data, key, nested=None):
+    for item in data:
+        values = item.get(key) if isinstance(item, dict) else None
+        if not isinstance(values, list):
+            continue
+        for value in values:
+            if nested is None:
+                yield value
+            elif isinstance(value, dict) and nested in value:
+                yield value[nested]
+
+
+class RecipeImportListSerializer(serializers.ListSerializer):
+    """Пачка рецептов импорта: теги и ингредиенты загружаются на всю пачку."""
+
+    def validate_items(self, data):
+        """(validated_data, None) или (None, errors) для каждого элемента."""
+        tags = self.child.fields['tags'].child_relation
+        ingredients = self.child.fields['ingredients'].child.fields['id']
+        tags.resolve(related_values(data, 'tags'))
+        ingredients.resolve(related_values(data, 'ingredients', 'id'))
+        results = []
+        try:
+            for item in data:
+                try:
+                    results.append((self.child.run_validation(item), None))
+                except serializers.ValidationError as error:
+                    results.append((None, error.detail))
+        finally:
+            tags.release()
+            ingredients.release()
+        return results
+
+
+class RecipeImportSerializer(RecipePostSerializer):
+    """Строка импорта -- тело POST /api/recipes/.
+
+    Изображение декодируется позже в пуле потоков, уникальность названий
+    проверяется одним запросом на пачку.
+    """
+    image = serializers.CharField()
+
+    class Meta(RecipePostSerializer.Meta):
+        extra_kwargs = {'name': {'validators': []}}
+        list_serializer_class = RecipeImportListSerializer
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
@@ -337,3 +538,15 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class ShoppingListSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
@@ -0,0 +1,161 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from foodgram_backend.db import (check_connections, configure_connection,
+                                 on_commit_once)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from recipes.signals import composition_changed
+
+from . import ingredient_suggestions, invalidation
+from .authentication import invalidate_tokens
+from .cache import bump_generation, invalidate_fragments
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if created or (update_fields is not None
+                   and update_fields <= {'last_login'}):
+        # Вход пользователя не меняет ни токены, ни ответы API.
+        return
+    invalidate_tokens(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+    # Данные автора входят в ответы со списком рецептов.
+    recipes_changed()
+    related_data_changed()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeIngredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def recipes_changed(**kwargs):
+    if kwargs.get('action', 'post').startswith('pre'):
+        return
+    transaction.on_commit(lambda: bump_generation('recipes'))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    configure_connection(connection)
+
+
+@receiver(request_started)
+def request_started_handler(sender, **kwargs):
+    check_connections()
+    invalidation.check()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def recipe_composition_changed(**kwargs):
+    if kwargs.get('action', 'post').startswith('pre'):
+        return
+    transaction.on_commit(lambda: bump_generation('ingredient_index'))
+
+
+@receiver(composition_changed, sender=Recipe)
+def recipe_ingredients_saved(sender, instance, **kwargs):
+    suggestions_changed(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_link_changed(sender, instance, **kwargs):
+    suggestions_changed(instance.recipe_id, instance.ingredient_id)
+
+
+def suggestions_changed(recipe_id, ingredient_id=None):
+    # Соседи всех затронутых ингредиентов пересчитываются одним вызовом
+    # после фиксации, а не по разу на каждую строку состава.
+    on_commit_once(
+        'ingredient_suggestions', [(recipe_id, ingredient_id)],
+        ingredient_suggestions.refresh
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_fragment_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_fragments(instance.pk))
+
+
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_link_fragment_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_fragments(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def recipe_links_fragment_changed(sender, instance, action, reverse, pk_set,
+                                  **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        transaction.on_commit(lambda: invalidate_fragments(instance.pk))
+    elif pk_set:
+        transaction.on_commit(lambda: invalidate_fragments(*pk_set))
+    else:
+        related_data_changed()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def related_data_changed(**kwargs):
+    """Теги, ингредиенты и авторы входят во фрагменты многих рецептов."""
+    transaction.on_commit(lambda: bump_generation('recipe_fragments'))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(**kwargs):
+    transaction.on_commit(lambda: bump_generation('ingredient_suggestions'))
+    transaction.on_commit(lambda: bump_generation('ingredients'))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(**kwargs):
+    transaction.on_commit(lambda: bump_generation('tags'))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_popularity_changed(**kwargs):
+    # Порядок ordering=popular меняется с каждым добавлением и удалением.
+    on_commit_once(
+        'popularity', (), lambda changes: bump_generation('popularity')
+    )
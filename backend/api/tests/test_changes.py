@@ -0,0 +1,33 @@
+from django.db import transaction
+
+from recipes.models import Recipe, RecipeChange
+
+from .utils import APITestCase
+
+
+class RecipeChangeLogTest(APITestCase):
+
+    def test_recorded_once(self):
+        recipe_id = self.create_recipe()
+        RecipeChange.objects.all().delete()
+        self.swap_ingredients(recipe_id)
+        self.assertEqual(list(RecipeChange.objects.values_list(
+            'recipe_id', 'deleted'
+        )), [(recipe_id, False)])
+        response = self.client.delete(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(RecipeChange.objects.order_by('id').values_list(
+            'recipe_id', 'deleted'
+        )), [(recipe_id, False), (recipe_id, True)])
+
+    def test_delete_supersedes_update(self):
+        recipe_id = self.create_recipe()
+        recipe = Recipe.objects.get(id=recipe_id)
+        RecipeChange.objects.all().delete()
+        with transaction.atomic():
+            recipe.text = 'Новое описание'
+            recipe.save()
+            recipe.delete()
+        self.assertEqual(list(RecipeChange.objects.values_list(
+            'recipe_id', 'deleted'
+        )), [(recipe_id, True)])
@@ -0,0 +1,56 @@
+import json
+
+from django.conf import settings
+from django.test import override_settings
+
+from api.concurrency import stats
+
+from .utils import IMAGE, APITestCase
+
+
+class StreamingSlotTest(APITestCase):
+
+    def import_recipes(self, *names):
+        lines = [json.dumps({
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': IMAGE,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+        }) for name in names]
+        return self.client.post(
+            '/api/recipes/import/', '\n'.join(lines),
+            content_type='application/x-ndjson'
+        )
+
+    def test_slot_held_while_streaming(self):
+        limits = {**settings.CONCURRENCY_LIMITS, 'recipe_import': 1}
+        with override_settings(
+            CONCURRENCY_LIMITS=limits, CONCURRENCY_QUEUE_TIMEOUT=0.1
+        ):
+            streaming = self.import_recipes('Первый')
+            self.assertEqual(streaming.status_code, 200)
+            self.assertEqual(stats(['recipe_import'])['recipe_import'][
+                'active'
+            ], 1)
+            self.assertEqual(self.import_recipes('Второй').status_code, 503)
+            report = b''.join(streaming.streaming_content).decode()
+            self.assertIn('id', json.loads(report.splitlines()[0]))
+            self.assertEqual(stats(['recipe_import'])['recipe_import'][
+                'active'
+            ], 0)
+            response = self.import_recipes('Третий')
+            self.assertEqual(response.status_code, 200)
+            b''.join(response.streaming_content)
+
+    def test_slot_released_on_close(self):
+        limits = {**settings.CONCURRENCY_LIMITS, 'recipe_import': 1}
+        with override_settings(
+            CONCURRENCY_LIMITS=limits, CONCURRENCY_QUEUE_TIMEOUT=0.1
+        ):
+            # Клиент отключился, не прочитав ответ.
+            self.import_recipes('Первый').close()
+            response = self.import_recipes('Второй')
+            self.assertEqual(response.status_code, 200)
+            b''.join(response.streaming_content)
@@ -0,0 +1,74 @@
+import time
+
+from .utils import APITestCase
+
+
+class RecipeValidatorsTest(APITestCase):
+
+    def test_scalar_edit_changes_etag(self):
+        recipe_id = self.create_recipe()
+        url = f'/api/recipes/{recipe_id}/'
+        detail_etag = self.anon.get(url)['ETag']
+        list_response = self.anon.get('/api/recipes/')
+        list_etag = list_response['ETag']
+        time.sleep(1)
+        response = self.client.patch(url, {
+            'text': 'Новое описание',
+            'tags': [self.tags[0].id],
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 5},
+                {'id': self.ingredients[1].id, 'amount': 7},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.anon.get(url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], detail_etag)
+        self.assertEqual(response.data['text'], 'Новое описание')
+        response = self.anon.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=list_etag,
+            HTTP_IF_MODIFIED_SINCE=list_response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_unchanged_update_keeps_etag(self):
+        recipe_id = self.create_recipe()
+        url = f'/api/recipes/{recipe_id}/'
+        etag = self.anon.get(url)['ETag']
+        response = self.client.patch(url, {
+            'name': 'Рецепт',
+            'tags': [self.tags[0].id],
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 5},
+                {'id': self.ingredients[1].id, 'amount': 7},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.anon.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_related_rename_changes_etag(self):
+        recipe_id = self.create_recipe()
+        url = f'/api/recipes/{recipe_id}/'
+        for related in (self.tags[0], self.ingredients[0], self.user):
+            detail = self.anon.get(url)
+            listing = self.anon.get('/api/recipes/')
+            time.sleep(1)
+            if related is self.user:
+                related.first_name = 'Пётр'
+            else:
+                related.name = f'{related.name} новый'
+            related.save()
+            response = self.anon.get(
+                url, HTTP_IF_NONE_MATCH=detail['ETag'],
+                HTTP_IF_MODIFIED_SINCE=detail['Last-Modified']
+            )
+            self.assertEqual(response.status_code, 200)
+            response = self.anon.get(
+                url, HTTP_IF_MODIFIED_SINCE=detail['Last-Modified']
+            )
+            self.assertEqual(response.status_code, 200)
+            response = self.anon.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=listing['ETag']
+            )
+            self.assertEqual(response.status_code, 200)
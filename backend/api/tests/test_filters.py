@@ -0,0 +1,100 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, RecipeIngredient
+
+from .utils import APITestCase
+
+
+class IngredientSearchTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        first, second, third = self.ingredients
+        compositions = [
+            [first], [first, second], [second], [first, second, third],
+            [third], [first, third], [first], [second, third],
+        ]
+        self.recipes = []
+        for number, ingredients in enumerate(compositions):
+            recipe = Recipe.objects.create(
+                author=self.user, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/test.png'
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=1)
+                for ingredient in ingredients
+            )
+            self.recipes.append(recipe)
+
+    def ids(self, client, query):
+        found = []
+        url = f'/api/recipes/?{query}&limit=3'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            found += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(response.data['count'], len(found))
+        return found
+
+    def expected(self, *numbers):
+        return sorted(
+            (self.recipes[number].id for number in numbers), reverse=True
+        )
+
+    def test_pages_from_index(self):
+        first, second, third = (
+            ingredient.id for ingredient in self.ingredients
+        )
+        queries = {
+            f'ingredients={first},{second}&match=all': (1, 3),
+            f'ingredients={first},{second}&match=any': (0, 1, 2, 3, 5, 6, 7),
+            f'ingredients={first},{second}&match=have': (0, 1, 2, 6),
+            f'ingredients={first}&match=have&missing=1': (0, 1, 5, 6),
+        }
+        for query, numbers in queries.items():
+            for client in (self.client, self.anon):
+                with self.subTest(query=query):
+                    self.assertEqual(
+                        self.ids(client, query), self.expected(*numbers)
+                    )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/api/recipes/?ingredients={first}&match=any')
+        self.assertFalse([
+            query['sql'] for query in queries.captured_queries
+            if 'COUNT(' in query['sql']
+        ])
+
+    def test_deleted_recipe_leaves_results(self):
+        first = self.ingredients[0].id
+        query = f'ingredients={first}&match=any'
+        self.assertEqual(
+            self.ids(self.anon, query), self.expected(0, 1, 3, 5, 6)
+        )
+        self.recipes[3].delete()
+        for client in (self.client, self.anon):
+            self.assertEqual(
+                self.ids(client, query), self.expected(0, 1, 5, 6)
+            )
+
+    @override_settings(INGREDIENT_SEARCH_MAX_IDS=0)
+    def test_join_with_other_filters(self):
+        first, second, third = (
+            ingredient.id for ingredient in self.ingredients
+        )
+        author = f'author={self.user.id}'
+        queries = {
+            f'ingredients={first},{second}&match=all': (1, 3),
+            f'ingredients={first},{second}&match=any': (0, 1, 2, 3, 5, 6, 7),
+            f'ingredients={first},{second}&match=have': (0, 1, 2, 6),
+            f'ingredients={first}&match=have&missing=1': (0, 1, 5, 6),
+        }
+        for query, numbers in queries.items():
+            with self.subTest(query=query):
+                self.assertEqual(
+                    self.ids(self.client, f'{query}&{author}'),
+                    self.expected(*numbers)
+                )
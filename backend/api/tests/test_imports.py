@@ -0,0 +1,77 @@
+import json
+import posixpath
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError
+from django.test import SimpleTestCase
+
+from api import imports
+from foodgram_backend.storage import ContentAddressedStorage
+from recipes.models import Recipe
+
+from .utils import IMAGE, APITestCase
+
+
+class ImportRollbackTest(APITestCase):
+
+    def test_shared_image_kept(self):
+        recipe = Recipe.objects.get(id=self.create_recipe())
+        line = json.dumps({
+            'name': 'Импорт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': IMAGE,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+        })
+        with mock.patch.object(imports, 'create', side_effect=IntegrityError):
+            response = self.client.post(
+                '/api/recipes/import/', line,
+                content_type='application/x-ndjson'
+            )
+            report = json.loads(b''.join(response.streaming_content))
+        self.assertIn('errors', report)
+        self.assertTrue(recipe.image.storage.exists(recipe.image.name))
+
+
+class ImportSimilarityTest(APITestCase):
+
+    def test_imported_recipes_similar(self):
+        recipe_id = self.create_recipe()
+        line = json.dumps({
+            'name': 'Импорт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': IMAGE,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+        })
+        response = self.client.post(
+            '/api/recipes/import/', line, content_type='application/x-ndjson'
+        )
+        report = json.loads(b''.join(response.streaming_content))
+        response = self.anon.get(f'/api/recipes/{report["id"]}/similar/')
+        self.assertEqual([item['id'] for item in response.data], [recipe_id])
+        response = self.anon.get(f'/api/recipes/{recipe_id}/similar/')
+        self.assertEqual(
+            [item['id'] for item in response.data], [report['id']]
+        )
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+
+    def test_concurrent_upload_keeps_name(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        storage = ContentAddressedStorage(location=location)
+        first = storage.save('images/a.png', ContentFile(b'image'))
+        # Вторая загрузка проверила exists() до того, как первая записала
+        # файл.
+        with mock.patch.object(storage, 'exists', side_effect=[False]):
+            second = storage.save('images/b.png', ContentFile(b'image'))
+        self.assertEqual(first, second)
+        directories, files = storage.listdir(posixpath.dirname(first))
+        self.assertEqual(files, [posixpath.basename(first)])
@@ -0,0 +1,45 @@
+from unittest import mock
+
+from recipes import popularity
+
+from .utils import APITestCase
+
+
+class PopularOrderingTest(APITestCase):
+
+    def ids(self, client, query='ordering=popular'):
+        response = client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_favorite_reorders_cached_page(self):
+        first, second, third = (
+            self.create_recipe(name) for name in ('Первый', 'Второй', 'Третий')
+        )
+        self.assertEqual(self.ids(self.anon), [third, second, first])
+        self.client.post(f'/api/recipes/{first}/favorite/')
+        self.assertEqual(self.ids(self.anon), [first, third, second])
+        self.client.delete(f'/api/recipes/{first}/favorite/')
+        self.client.post(f'/api/recipes/{second}/shopping_cart/')
+        self.assertEqual(self.ids(self.anon)[0], second)
+
+    def test_pages_match_sql_ordering(self):
+        recipe_ids = [self.create_recipe(f'Рецепт {i}') for i in range(8)]
+        for recipe_id in recipe_ids[2:6]:
+            self.client.post(f'/api/recipes/{recipe_id}/favorite/')
+        self.client.post(f'/api/recipes/{recipe_ids[3]}/shopping_cart/')
+        pages = []
+        for page in (1, 2, 3):
+            query = f'ordering=popular&limit=3&page={page}'
+            pages.append(self.ids(self.client, query))
+            # С другим фильтром порядок задаёт сортировка в SQL.
+            self.assertEqual(pages[-1], self.ids(
+                self.client, f'{query}&author={self.user.id}'
+            ))
+        self.assertEqual(sum(pages, []), [
+            recipe_ids[3], recipe_ids[5], recipe_ids[4], recipe_ids[2],
+            recipe_ids[7], recipe_ids[6], recipe_ids[1], recipe_ids[0],
+        ])
+        with mock.patch.object(popularity, 'top', wraps=popularity.top) as top:
+            self.ids(self.client, 'ordering=popular&limit=3')
+        top.assert_called_once_with('all', 3)
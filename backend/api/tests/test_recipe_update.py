@@ -0,0 +1,27 @@
+from unittest import mock
+
+from recipes import cooccurrence, shopping_list, similarity
+
+from .utils import APITestCase
+
+
+class ScalarUpdateTest(APITestCase):
+
+    def test_text_edit_skips_composition_work(self):
+        recipe_id = self.create_recipe()
+        self.client.post(f'/api/recipes/{recipe_id}/shopping_cart/')
+        with mock.patch.object(similarity, 'refresh') as refresh, \
+                mock.patch.object(cooccurrence, 'refresh') as neighbours, \
+                mock.patch.object(shopping_list, 'recount') as recount:
+            response = self.client.patch(f'/api/recipes/{recipe_id}/', {
+                'text': 'Исправленное описание',
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 5},
+                    {'id': self.ingredients[1].id, 'amount': 7},
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        refresh.assert_not_called()
+        neighbours.assert_not_called()
+        recount.assert_not_called()
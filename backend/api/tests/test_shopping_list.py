@@ -0,0 +1,38 @@
+from unittest import mock
+
+from django.db import transaction
+
+from recipes import shopping_list
+from recipes.models import ShoppingListItem
+
+from .utils import APITestCase
+
+
+class ShoppingListRecountTest(APITestCase):
+
+    def test_recounted_once_in_transaction(self):
+        recipe_id = self.create_recipe()
+        response = self.client.post(f'/api/recipes/{recipe_id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201, response.content)
+        in_transaction = []
+        recount = shopping_list.recount
+
+        def tracked(*args):
+            in_transaction.append(
+                transaction.get_connection().in_atomic_block
+            )
+            return recount(*args)
+
+        with mock.patch.object(shopping_list, 'recount', side_effect=tracked):
+            self.swap_ingredients(recipe_id)
+        # Один пересчёт, ещё до фиксации правки.
+        self.assertEqual(in_transaction, [True])
+        self.assertEqual(
+            set(ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'amount'
+            )),
+            {(self.ingredients[1].id, 8), (self.ingredients[2].id, 9)}
+        )
+        response = self.client.delete(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ShoppingListItem.objects.filter(user=self.user))
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from recipes import similarity
+from recipes.models import Recipe, RecipeIngredient
+
+from .utils import APITestCase
+
+
+class SimilarityRefreshTest(APITestCase):
+
+    def test_refreshed_once(self):
+        recipe_id = self.create_recipe()
+        with mock.patch.object(similarity, 'refresh') as refresh:
+            self.swap_ingredients(recipe_id)
+        refresh.assert_called_once_with(recipe_id, mock.ANY)
+
+    def test_candidates_capped(self):
+        recipes = [
+            Recipe.objects.create(
+                author=self.user, name=f'Рецепт {i}', text='Описание',
+                cooking_time=5, image='recipes/images/test.png'
+            )
+            for i in range(5)
+        ]
+        common, rare, _ = self.ingredients
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=common, amount=1)
+            for recipe in recipes
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=rare, amount=1)
+            for recipe in recipes[:2]
+        )
+        candidates = similarity.candidate_ids(
+            [common.id, rare.id], recipes[0].id, limit=3
+        )
+        self.assertEqual(candidates, {recipes[1].id})
+        candidates = similarity.candidate_ids(
+            [common.id], recipes[0].id, limit=3
+        )
+        self.assertEqual(candidates, {recipe.id for recipe in recipes[2:]})
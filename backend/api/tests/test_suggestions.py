@@ -0,0 +1,16 @@
+from unittest import mock
+
+from recipes import cooccurrence
+
+from .utils import APITestCase
+
+
+class SuggestionsRefreshTest(APITestCase):
+
+    def test_refreshed_once(self):
+        recipe_id = self.create_recipe()
+        with mock.patch.object(cooccurrence, 'refresh') as refresh:
+            self.swap_ingredients(recipe_id)
+        refresh.assert_called_once_with(
+            {ingredient.id for ingredient in self.ingredients}
+        )
@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+
+from rest_framework.test import APIClient, APITransactionTestCase
+
+from recipes.models import Ingredient, Tag
+
+User = get_user_model()
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA'
+    'CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAA'
+    'ggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+class APITestCase(APITransactionTestCase):
+    """Пользователь с токеном, теги и ингредиенты.
+
+    Транзакционный тест, чтобы срабатывали обработчики on_commit.
+    """
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass12345',
+            first_name='Иван', last_name='Иванов'
+        )
+        self.tags = [
+            Tag.objects.create(name=f'Тег {i}', color='#FFFFFF', slug=f't{i}')
+            for i in range(2)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {i}', measurement_unit='г'
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        response = self.client.post('/api/auth/token/login/', {
+            'email': 'cook@example.com', 'password': 'pass12345'
+        })
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token ' + response.data['auth_token']
+        )
+        self.anon = APIClient()
+
+    def create_recipe(self, name='Рецепт'):
+        response = self.client.post('/api/recipes/', {
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [self.tags[0].id],
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 5},
+                {'id': self.ingredients[1].id, 'amount': 7},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.data['id']
+
+    def swap_ingredients(self, recipe_id):
+        """Меняет теги и состав рецепта: одна строка остаётся, две новые."""
+        response = self.client.patch(f'/api/recipes/{recipe_id}/', {
+            'tags': [self.tags[1].id],
+            'ingredients': [
+                {'id': self.ingredients[1].id, 'amount': 8},
+                {'id': self.ingredients[2].id, 'amount': 9},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
@@ -0,0 +1,100 @@
+"""Ограничение частоты запросов скользящим окном в общем кеше.
+
+Вместо списка меток времени DRF на каждого клиента хранятся два счётчика:
+текущего и предыдущего окна. Оценка числа запросов за последние duration
+секунд -- счётчик текущего окна плюс доля предыдущего, пропорциональная
+оставшейся части окна. Счётчик увеличивается атомарным cache.incr, поэтому
+при общем кеше (memcached) лимит соблюдается во всех воркерах, а запрос
+стоит два обращения к кешу независимо от лимита.
+"""
+from rest_framework.throttling import (AnonRateThrottle, SimpleRateThrottle,
+                                       UserRateThrottle)
+
+
+class SlidingWindowMixin:
+
+    def window_key(self, window):
+        return f'{self.key}:{window}'
+
+    def hit(self, key):
+        """Атомарно увеличивает счётчик окна и возвращает новое значение."""
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Окно хранится два периода: следующее окно читает его как
+            # предыдущее.
+            if self.cache.add(key, 1, 2 * self.duration):
+                return 1
+            return self.cache.incr(key)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        window, self.elapsed = divmod(self.now, self.duration)
+        window = int(window)
+        current_key = self.window_key(window)
+        self.current = self.hit(current_key)
+        self.previous = self.cache.get(self.window_key(window - 1), 0)
+        if self.estimate(self.current) <= self.num_requests:
+            return True
+        # Отклонённый запрос не расходует лимит.
+        self.current -= 1
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+        return False
+
+    def estimate(self, current):
+        weight = 1 - self.elapsed / self.duration
+        return self.previous * weight + current
+
+    def wait(self):
+        """Секунды до момента, когда следующий запрос уложится в лимит."""
+        if self.current + 1 > self.num_requests:
+            return self.duration - self.elapsed
+        free = self.num_requests - self.current - 1
+        allowed_at = self.duration * (1 - free / self.previous)
+        return max(allowed_at - self.elapsed, 0)
+
+
+class UserThrottle(SlidingWindowMixin, UserRateThrottle):
+    pass
+
+
+class AnonThrottle(SlidingWindowMixin, AnonRateThrottle):
+    pass
+
+
+class ActionThrottle(SlidingWindowMixin, SimpleRateThrottle):
+    """Отдельный лимит для действий из throttle_scopes представления.
+
+    throttle_scopes -- словарь действие -> область DEFAULT_THROTTLE_RATES,
+    например {'create': 'recipe_create'}. Действия вне словаря не
+    ограничиваются. Лимит действует в дополнение к общим user/anon.
+    """
+
+    def __init__(self):
+        # Область известна только в allow_request.
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None)
+        )
+        if self.scope is None:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -1,40 +1,41 @@
-import io
-
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
-import reportlab.rl_config
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.permissions import (SAFE_METHODS, AllowAny, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from foodgram_backend.constants import (MAX_PAGE_SIZE, SIMILAR_RECIPES,
+                                        SUGGESTED_INGREDIENTS, TRENDING_LIMIT)
+from recipes import changes, feed, popularity
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 from users.models import Follow
 
-from .filters import IngredientFilter, RecipeFilter
-from .paginations import CustomPagination
+from . import (concurrency, delivery, exports, imports, ingredient_suggestions,
+               invalidation, pdf)
+from .cache import LocalLRUCache, get_generation, get_or_build, query_cache_key
+from .concurrency import ConcurrencyLimitMixin
+from .conditional import (not_modified, recipe_list_validators,
+                          recipe_search_validators, recipe_validators,
+                          set_validators)
+from .filters import IngredientFilter, RecipeFilter, UsernamePrefixFilter
+from .paginations import (ChangesCursorPagination, CustomPagination,
+                          FeedCursorPagination)
 from .permissions import IsAuthorOrAdminOrReadOnly
 from .serializers import (FavoriteSerializer, IngredientSerializer,
                           RecipeGetSerializer, RecipePostSerializer,
                           SetPasswordSerializer, ShoppingCartSerializer,
-                          SubscriptionsSerializer, TagSerializer,
-                          UserGetSerializer, UserPostSerializer)
-
-reportlab.rl_config.warnOnMissingFontGlyphs = 0
-reportlab.rl_config.TTFSearchPath.append(
-    str(settings.BASE_DIR) + '/lib/reportlab/fonts'
-)
-pdfmetrics.registerFont(TTFont('DejaVuSerif', 'DejaVuSerif.ttf', 'UTF-8'))
+                          ShoppingListSerializer, SubscriptionsSerializer,
+                          TagSerializer, UserGetSerializer, UserPostSerializer)
 
 User = get_user_model()
 
@@ -45,12 +46,22 @@ class ListRetrieveViewSet(mixins.ListModelMixin,
     pass
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConcurrencyLimitMixin, viewsets.ModelViewSet):
     queryset = User.objects.order_by('-id')
     permission_classes = (AllowAny,)
     pagination_class = CustomPagination
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('username',)
+    filter_backends = (UsernamePrefixFilter,)
+    concurrency_scopes = {'recipes_archive': 'recipe_export'}
+
+    def get_queryset(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return self.queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return self.queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, following=OuterRef('pk'))
+        ))
 
     def get_serializer_class(self):
         # print(self.request.data)
@@ -64,8 +75,8 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def me(self, request):
-        user = self.request.user
-        serializer = UserGetSerializer(user)
+        user = self.get_queryset().get(pk=request.user.pk)
+        serializer = UserGetSerializer(user, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
@@ -107,6 +118,18 @@ class UserViewSet(viewsets.ModelViewSet):
             serializer.data
         )
 
+    @action(
+        methods=['get'],
+        detail=True,
+        permission_classes=(IsAuthenticated,)
+    )
+    def recipes_archive(self, request, pk):
+        author = get_object_or_404(User, id=pk)
+        return exports.export_recipes(
+            author.recipes.order_by('id'), request,
+            f'recipes_{author.username}.ndjson'
+        )
+
     @action(
         methods=['post'],
         detail=True,
@@ -137,75 +160,363 @@ class UserViewSet(viewsets.ModelViewSet):
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(ListRetrieveViewSet):
+local_lists = LocalLRUCache(
+    settings.LOCAL_LIST_CACHE_SIZE, settings.LOCAL_LIST_CACHE_TIMEOUT
+)
+invalidation.register('tags', local_lists.clear)
+invalidation.register('ingredients', local_lists.clear)
+
+
+class CachedListMixin:
+    """Список из кеша, общий для всех пользователей.
+
+    Ключ -- адрес запроса и поколение cache_namespace, которое повышают
+    сигналы при изменении модели. Поколение берётся из проверки в начале
+    запроса, поэтому повторный список отдаётся из памяти процесса без
+    обращений к общему кешу.
+    """
+    cache_namespace = None
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        key = query_cache_key(
+            f'{self.cache_namespace}:list:'
+            f'{invalidation.version(self.cache_namespace)}', request
+        )
+        data = local_lists.get(key)
+        if data is None:
+            parent = super()
+            data = get_or_build(
+                key, lambda: parent.list(request, *args, **kwargs).data,
+                self.cache_timeout
+            )
+            local_lists.set(key, data)
+        return Response(data)
+
+
+class TagViewSet(CachedListMixin, ListRetrieveViewSet):
     queryset = Tag.objects.order_by('id')
     serializer_class = TagSerializer
     pagination_class = None
+    cache_namespace = 'tags'
+    cache_timeout = settings.TAG_LIST_CACHE_TIMEOUT
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(CachedListMixin, ListRetrieveViewSet):
     queryset = Ingredient.objects.order_by('id')
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    cache_namespace = 'ingredients'
+    cache_timeout = settings.INGREDIENT_LIST_CACHE_TIMEOUT
+
+    @action(
+        methods=['get'],
+        detail=False,
+    )
+    def suggest(self, request):
+        try:
+            ingredient_ids = [
+                int(value)
+                for value in request.query_params.get(
+                    'ingredients', ''
+                ).split(',') if value
+            ]
+            limit = int(
+                request.query_params.get('limit', SUGGESTED_INGREDIENTS)
+            )
+        except ValueError:
+            return Response(
+                {'errors': 'Передайте id ингредиентов через запятую.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            ingredient_suggestions.suggest(
+                ingredient_ids, min(max(limit, 1), MAX_PAGE_SIZE)
+            ),
+            status=status.HTTP_200_OK
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConcurrencyLimitMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.order_by('-id')
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend, filters.SearchFilter,)
     pagination_class = CustomPagination
     filterset_class = RecipeFilter
     search_fields = ('^name',)
+    throttle_scopes = {
+        'create': 'recipe_create',
+        'bulk_import': 'recipe_import',
+        'download_shopping_cart': 'shopping_cart_download',
+    }
+    concurrency_scopes = {
+        'create': 'recipe_create',
+        'bulk_import': 'recipe_import',
+        'download_shopping_cart': 'shopping_cart_download',
+    }
+
+    def get_concurrency_scope(self):
+        # Поиск по ингредиентам заметно тяжелее обычного списка.
+        if (self.action == 'list'
+                and 'ingredients' in self.request.query_params):
+            return 'recipe_search'
+        return super().get_concurrency_scope()
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeGetSerializer
         return RecipePostSerializer
 
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            found = self.search_only()
+            if found is not None:
+                return self.list_ids(found[::-1])
+            if self.popular_only():
+                return self.list_ids(popularity.Ranking(self.get_queryset()))
+            return super().list(request, *args, **kwargs)
+        generation = get_generation('recipes')
+        if request.query_params.get('ordering') == 'popular':
+            generation = f'{generation}:{get_generation("popularity")}'
+        key = query_cache_key(f'recipes:list:{generation}', request)
+        data, etag, last_modified = get_or_build(
+            key, lambda: self.build_anonymous_list(request, *args, **kwargs),
+            settings.RECIPE_LIST_CACHE_TIMEOUT
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        return set_validators(Response(data), etag, last_modified)
+
+    def only_params(self, *names):
+        """В запросе нет параметров, кроме names и параметров страницы."""
+        return not set(self.request.query_params) - {
+            *names,
+            self.paginator.page_query_param,
+            self.paginator.page_size_query_param,
+        }
+
+    def popular_only(self):
+        return (self.request.query_params.get('ordering') == 'popular'
+                and self.only_params('ordering'))
+
+    def search_only(self):
+        """Найденные по индексу id, если других фильтров в запросе нет.
+
+        Тогда число рецептов и страница берутся из отсортированного
+        результата поиска, а в SQL уходят только id одной страницы.
+        """
+        if ('ingredients' not in self.request.query_params
+                or not self.only_params('ingredients', 'match', 'missing')):
+            return None
+        filterset = self.filterset_class(
+            self.request.query_params, queryset=self.get_queryset(),
+            request=self.request
+        )
+        if not filterset.is_valid():
+            return None
+        value = filterset.form.cleaned_data['ingredients']
+        if not value:
+            return None
+        return filterset.search_ingredients(value)
+
+    def list_ids(self, recipe_ids):
+        """Страница списка по упорядоченной последовательности id."""
+        page = [int(pk) for pk in self.paginate_queryset(recipe_ids)]
+        recipes = self.get_queryset().in_bulk(page)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in page if pk in recipes], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def build_anonymous_list(self, request, *args, **kwargs):
+        found = self.search_only()
+        if found is not None:
+            etag, last_modified = recipe_search_validators(
+                self.get_queryset(), found
+            )
+            # Список упорядочен по убыванию id, результат поиска -- по
+            # возрастанию.
+            return self.list_ids(found[::-1]).data, etag, last_modified
+        if self.popular_only():
+            etag, last_modified = recipe_list_validators(
+                self.get_queryset(), get_generation('popularity')
+            )
+            return self.list_ids(
+                popularity.Ranking(self.get_queryset())
+            ).data, etag, last_modified
+        etag, last_modified = recipe_list_validators(
+            self.filter_queryset(self.get_queryset()),
+            get_generation('popularity')
+            if request.query_params.get('ordering') == 'popular' else ''
+        )
+        response = super().list(request, *args, **kwargs)
+        return response.data, etag, last_modified
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = recipe_validators(instance, request.user)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(instance)
+        return set_validators(
+            Response(serializer.data), etag, last_modified
+        )
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(
+        methods=['get'],
+        detail=True,
+    )
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, id=pk)
+        recipe_ids = list(
+            recipe.similar_recipes.order_by('-score').values_list(
+                'similar_id', flat=True
+            )[:SIMILAR_RECIPES]
+        )
+        recipes = Recipe.objects.in_bulk(recipe_ids)
+        serializer = RecipeGetSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['post'],
+        detail=False,
+        url_path='import',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_import(self, request):
+        stream = request.stream
+        if stream is None:
+            return Response(
+                {'errors': 'Передайте рецепты в формате NDJSON.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return StreamingHttpResponse(
+            exports.buffered(exports.ndjson(imports.import_recipes(
+                iter(stream.readline, b''), request.user
+            ))),
+            content_type='application/x-ndjson'
+        )
+
+    @action(
+        methods=['get'],
+        detail=False,
+    )
+    def trending(self, request):
+        window = request.query_params.get('window', 'week')
+        if window not in popularity.SCORE_FIELDS:
+            return Response(
+                {
+                    'errors': 'Допустимые периоды: '
+                              + ', '.join(popularity.SCORE_FIELDS),
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', TRENDING_LIMIT))
+        except ValueError:
+            limit = TRENDING_LIMIT
+        recipe_ids = popularity.top(window, min(max(limit, 1), MAX_PAGE_SIZE))
+        recipes = Recipe.objects.in_bulk(recipe_ids)
+        serializer = RecipeGetSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        paginator = FeedCursorPagination()
+        page_size = paginator.get_page_size(request)
+        recipe_ids = feed.read(
+            request.user, paginator.get_cursor(request), page_size
+        )
+        recipes = Recipe.objects.in_bulk(recipe_ids)
+        serializer = RecipeGetSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True, context={'request': request}
+        )
+        return paginator.get_paginated_response(
+            request, recipe_ids, page_size, serializer.data
+        )
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(AllowAny,)
+    )
+    def changes(self, request):
+        paginator = ChangesCursorPagination()
+        page_size = paginator.get_page_size(request)
+        page = changes.read(paginator.get_cursor(request) or 0, page_size)
+        updated_ids, deleted_ids = changes.latest(page)
+        recipes = Recipe.objects.in_bulk(updated_ids)
+        serializer = RecipeGetSerializer(
+            [recipes[pk] for pk in updated_ids if pk in recipes],
+            many=True, context={'request': request}
+        )
+        return paginator.get_paginated_response(
+            request, page, page_size, serializer.data, deleted_ids
+        )
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_list(self, request):
+        serializer = ShoppingListSerializer(
+            self.get_shopping_list(request), many=True
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(
         methods=['get'],
         detail=False,
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        queryset = RecipeIngredient.objects.filter(
-            recipe__recipe_in_cart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(sum_amount=Sum('amount'))
-
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer)
-        p.setFont('DejaVuSerif', 16)
-        y = 700
-        p.drawString(100, y + 50, 'Список покупок')
-        p.setFont('DejaVuSerif', 14)
-        for qs in queryset:
-            name = qs['ingredient__name']
-            amount = qs['sum_amount']
-            measurement_unit = qs['ingredient__measurement_unit']
-            p.drawString(
-                100, y,
-                f'{name} - {amount} {measurement_unit}'
+        file_format = request.query_params.get('type', 'pdf')
+        if file_format in exports.SHOPPING_LIST_FORMATS:
+            return exports.export_shopping_list(
+                self.get_shopping_list(request), file_format
             )
-            y -= 30
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        return FileResponse(
-            buffer, as_attachment=True,
-            filename='shopping_cart.pdf',
-            status=status.HTTP_200_OK
+        if file_format != 'pdf':
+            return Response(
+                {
+                    'errors': 'Допустимые форматы: pdf, '
+                              + ', '.join(exports.SHOPPING_LIST_FORMATS),
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        rows = exports.shopping_list_rows(self.get_shopping_list(request))
+        path = delivery.spool(
+            lambda path: pdf.render_shopping_list(path, rows), '.pdf'
         )
+        return delivery.deliver(path, 'shopping_cart.pdf', 'application/pdf')
+
+    def get_shopping_list(self, request):
+        return request.user.shopping_list.select_related(
+            'ingredient'
+        ).order_by('ingredient__name')
 
     @action(
         methods=['post'],
@@ -262,7 +573,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        serializer.save(user=request.user, recipe=recipe)
+        # Список покупок пересчитывается в той же транзакции.
+        with transaction.atomic():
+            serializer.save(user=request.user, recipe=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_shopping_cart_or_favorite(self, request, pk, model):
@@ -278,5 +591,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MetricsView(APIView):
+    """Состояние ограничителей нагрузки для мониторинга."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({'concurrency': concurrency.stats()})
@@ -3,3 +3,11 @@ MEDIUM_FIELD = 200
 SHORT_FIELD = 150
 LOWER_LIMIT = 1
 MAX_PAGE_SIZE = 100
+TRENDING_LIMIT = 10
+SIMILAR_RECIPES = 10
+INGREDIENT_NEIGHBOURS = 20
+SUGGESTED_INGREDIENTS = 10
+EXPORT_CHUNK_SIZE = 500
+EXPORT_BUFFER_SIZE = 64 * 1024
+SIMILAR_CANDIDATES = 2000
+POPULAR_TOP = 1000
@@ -0,0 +1,112 @@
+"""Настройка соединений с базой данных и работа с транзакциями."""
+from django.conf import settings
+from django.db import connections, transaction
+
+
+def apply_sqlite_pragmas(cursor, pragmas=None):
+    """Включает WAL и остальные PRAGMA из settings.SQLITE_PRAGMAS."""
+    if pragmas is None:
+        pragmas = settings.SQLITE_PRAGMAS
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+
+
+def configure_connection(connection):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            apply_sqlite_pragmas(cursor)
+
+
+def check_connections():
+    """Закрывает постоянные соединения, которые перестали отвечать.
+
+    Аналог CONN_HEALTH_CHECKS из Django 4.1: вызывается в начале запроса,
+    чтобы воркер не получил ошибку на соединении, разорванном сервером.
+    """
+    for connection in connections.all():
+        if (connection.connection is None
+                or not connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                or connection.in_atomic_block):
+            continue
+        if not connection.is_usable():
+            connection.close()
+
+
+def current_set(connection, key):
+    """Множество key текущей транзакции или None, если его ещё нет."""
+    items, run = connection.__dict__.get('transaction_sets', {}).get(
+        key, (None, None)
+    )
+    # После отката обработчиков on_commit нет, и множество устарело.
+    if items is not None and any(
+        func is run for _, func in connection.run_on_commit
+    ):
+        return items
+    return None
+
+
+def transaction_set(connection, key, flush=None):
+    """Множество key, общее для текущей транзакции соединения.
+
+    После фиксации вызывается flush(множество), и следующая транзакция
+    получает новое множество. При откате вместе с обработчиками on_commit
+    пропадает и множество.
+    """
+    items = current_set(connection, key)
+    if items is not None:
+        return items
+    sets = connection.__dict__.setdefault('transaction_sets', {})
+    items = set()
+
+    def run():
+        if sets.get(key, (None, None))[1] is run:
+            del sets[key]
+        if flush is not None:
+            flush(items)
+
+    sets[key] = items, run
+    transaction.on_commit(run, using=connection.alias)
+    return items
+
+
+def on_commit_once(key, items, flush, using=None):
+    """Копит items за транзакцию и вызывает flush(множество) один раз.
+
+    Сигналы моделей приходят на каждую строку; так вызванная по ним
+    тяжёлая обработка выполняется после фиксации один раз для всех
+    затронутых объектов. Вне транзакции flush вызывается сразу.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        flush(set(items))
+        return
+    transaction_set(connection, key, flush).update(items)
+
+
+def take_from_transaction(key, predicate, using=None):
+    """Забирает из множества key текущей транзакции подходящие элементы.
+
+    Так накопленное для обработки после фиксации можно обработать раньше,
+    ещё в транзакции; забранное flush уже не получит.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return set()
+    items = current_set(connection, key)
+    if items is None:
+        return set()
+    taken = {item for item in items if predicate(item)}
+    items -= taken
+    return taken
+
+
+def first_in_transaction(key, items, using=None):
+    """Элементы items, которые ещё не встречались в текущей транзакции."""
+    items = set(items)
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return items
+    seen = transaction_set(connection, key)
+    items -= seen
+    seen |= items
+    return items
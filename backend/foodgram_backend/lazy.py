@@ -0,0 +1,23 @@
+"""Отложенный импорт тяжёлых модулей."""
+import importlib
+
+
+class LazyModule:
+    """Модуль, который импортируется при первом обращении к атрибуту.
+
+    numpy и scipy нужны только поиску по ингредиентам и пересчётам
+    похожести, а их импорт занимает сотни миллисекунд: без отложенного
+    импорта их платят запуск каждого воркера и каждая команда manage.py.
+    import_module потокобезопасен, найденные атрибуты запоминаются.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+
+    def __getattr__(self, attr):
+        value = getattr(importlib.import_module(self.__name), attr)
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self):
+        return f'<LazyModule {self.__name}>'
@@ -0,0 +1,47 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.deprecation import MiddlewareMixin
+
+from rest_framework.permissions import SAFE_METHODS
+
+from .routers import pin_primary, replica_aliases, unpin_primary
+
+
+class PrimaryStickinessMiddleware(MiddlewareMixin):
+    """Закрепляет клиента за основной базой после записи.
+
+    Небезопасные запросы целиком выполняются на основной базе. После них
+    клиент (токен из заголовка Authorization или сессия) ещё
+    DB_REPLICA_STICKY_SECONDS секунд читает из основной базы, чтобы
+    видеть свои изменения, пока реплики догоняют.
+    """
+
+    def client_key(self, request):
+        credentials = request.META.get('HTTP_AUTHORIZATION')
+        if not credentials and hasattr(request, 'session'):
+            credentials = request.session.session_key
+        if not credentials:
+            return None
+        return 'db_sticky:' + hashlib.sha256(credentials.encode()).hexdigest()
+
+    def process_request(self, request):
+        request._db_primary_token = None
+        if not replica_aliases():
+            return
+        key = self.client_key(request)
+        if request.method not in SAFE_METHODS or (
+            key is not None and cache.get(key)
+        ):
+            request._db_primary_token = pin_primary()
+
+    def process_response(self, request, response):
+        token = getattr(request, '_db_primary_token', None)
+        if token is not None:
+            unpin_primary(token)
+        if request.method not in SAFE_METHODS and replica_aliases():
+            key = self.client_key(request)
+            if key is not None:
+                cache.set(key, True, settings.DB_REPLICA_STICKY_SECONDS)
+        return response
@@ -0,0 +1,52 @@
+"""Маршрутизация запросов между основной базой и репликами."""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY_DB = 'default'
+
+_use_primary = ContextVar('use_primary', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != PRIMARY_DB]
+
+
+def pin_primary():
+    """Направляет чтения в основную базу до вызова unpin_primary()."""
+    return _use_primary.set(True)
+
+
+def unpin_primary(token):
+    _use_primary.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Направляет все чтения внутри блока в основную базу."""
+    token = pin_primary()
+    try:
+        yield
+    finally:
+        unpin_primary(token)
+
+
+class ReplicaRouter:
+    """Чтение из случайной реплики, запись и миграции в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or _use_primary.get():
+            return PRIMARY_DB
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'foodgram_backend.middleware.PrimaryStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -70,19 +71,75 @@ WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 
 
 # Database
-DATABASES = {
-    'default': {
-        # 'ENGINE': 'django.db.backends.postgresql',
-        # 'NAME': os.getenv('POSTGRES_DB', 'django'),
-        # 'USER': os.getenv('POSTGRES_USER', 'django'),
-        # 'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
-        # 'HOST': os.getenv('DB_HOST', ''),
-        # 'PORT': os.getenv('DB_PORT', 5432)
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': 'db.sqlite3',
+# DB_ENGINE: `sqlite3` (default) or `postgresql`.
+DB_ENGINE = env.str('DB_ENGINE', default='sqlite3')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': env.str('POSTGRES_DB', default='django'),
+            'USER': env.str('POSTGRES_USER', default='django'),
+            'PASSWORD': env.str('POSTGRES_PASSWORD', default=''),
+            'HOST': env.str('DB_HOST', default=''),
+            'PORT': env.int('DB_PORT', default=5432),
+            'OPTIONS': {
+                'connect_timeout': env.int('DB_CONNECT_TIMEOUT', default=5),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env.str('SQLITE_NAME', default='db.sqlite3'),
+            'OPTIONS': {
+                'timeout': env.int('SQLITE_BUSY_TIMEOUT', default=5000) / 1000,
+            },
+        }
     }
+
+# Shared cache: throttling counters, cache generations and build locks
+# must be common to all gunicorn workers. Without CACHE_LOCATION every
+# process gets its own local-memory cache (development only).
+CACHE_LOCATION = env.list('CACHE_LOCATION', default=[])
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_LOCATION,
+        }
+    }
+
+# Persistent connections: reused by a worker thread for CONN_MAX_AGE seconds
+# and pinged at request start when CONN_HEALTH_CHECKS is on.
+DATABASES['default']['CONN_MAX_AGE'] = env.int('CONN_MAX_AGE', default=60)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env.bool('CONN_HEALTH_CHECKS', default=True)
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT', default=5000),
+    'synchronous': 'NORMAL',
+    'mmap_size': env.int('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024),
 }
 
+# Read replicas: hosts for PostgreSQL, database files for SQLite.
+# Writes and migrations always go to `default`.
+DB_REPLICAS = env.list('DB_REPLICAS', default=[])
+for index, replica in enumerate(DB_REPLICAS):
+    location = 'NAME' if 'sqlite3' in DATABASES['default']['ENGINE'] else 'HOST'
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        location: replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram_backend.routers.ReplicaRouter']
+
+# Seconds a client keeps reading from `default` after a write
+DB_REPLICA_STICKY_SECONDS = env.int('DB_REPLICA_STICKY_SECONDS', default=5)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -123,6 +180,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media/'
+# Uploads are named by content hash: deduplicated and safe to cache forever
+DEFAULT_FILE_STORAGE = 'foodgram_backend.storage.ContentAddressedStorage'
 
 # Default primary key field type
 
@@ -133,16 +192,77 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny', 
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
+        'api.throttling.UserThrottle',
+        'api.throttling.AnonThrottle',
+        'api.throttling.ActionThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '10000/day',
         'anon': '1000/day',
+        'recipe_create': '100/hour',
+        'recipe_import': '10/hour',
+        'shopping_cart_download': '60/hour',
     },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
+
+# Token authentication cache (seconds / entries)
+AUTH_TOKEN_CACHE_TIMEOUT = env.int('AUTH_TOKEN_CACHE_TIMEOUT', default=300)
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = env.int('AUTH_TOKEN_LOCAL_CACHE_TIMEOUT', default=60)
+AUTH_TOKEN_LOCAL_CACHE_SIZE = env.int('AUTH_TOKEN_LOCAL_CACHE_SIZE', default=1024)
+
+# Recipe feed: authors above the fan-out limit are merged in on read
+FEED_FANOUT_LIMIT = env.int('FEED_FANOUT_LIMIT', default=10000)
+FEED_BACKFILL = env.int('FEED_BACKFILL', default=100)
+FEED_MAX_LENGTH = env.int('FEED_MAX_LENGTH', default=1000)
+
+# Delta sync: change-log rows younger than this are not served yet, so a
+# transaction that commits after a later id is still picked up
+RECIPE_CHANGES_SETTLE = env.int('RECIPE_CHANGES_SETTLE', default=5)
+
+# Ingredient search combined with other filters: larger match sets are
+# filtered with a join instead of an id list
+INGREDIENT_SEARCH_MAX_IDS = env.int('INGREDIENT_SEARCH_MAX_IDS', default=1000)
+
+# Response caches are invalidated by generation, the timeout only evicts
+RECIPE_LIST_CACHE_TIMEOUT = env.int('RECIPE_LIST_CACHE_TIMEOUT', default=24 * 60 * 60)
+RECIPE_FRAGMENT_CACHE_TIMEOUT = env.int('RECIPE_FRAGMENT_CACHE_TIMEOUT', default=24 * 60 * 60)
+TAG_LIST_CACHE_TIMEOUT = env.int('TAG_LIST_CACHE_TIMEOUT', default=24 * 60 * 60)
+INGREDIENT_LIST_CACHE_TIMEOUT = env.int('INGREDIENT_LIST_CACHE_TIMEOUT', default=60 * 60)
+# Process-local copy of the reference lists, dropped via api.invalidation
+LOCAL_LIST_CACHE_SIZE = env.int('LOCAL_LIST_CACHE_SIZE', default=512)
+LOCAL_LIST_CACHE_TIMEOUT = env.int('LOCAL_LIST_CACHE_TIMEOUT', default=60 * 60)
+# Stampede protection: lock lifetime, how long other requests wait and how
+# long an expired entry is still served while one request rebuilds it
+CACHE_BUILD_LOCK_TIMEOUT = 30
+CACHE_BUILD_WAIT = 2
+CACHE_STALE_TIMEOUT = env.int('CACHE_STALE_TIMEOUT', default=5 * 60)
+
+# Bulk recipe import: lines per transaction and image decoding threads
+IMPORT_BATCH_SIZE = env.int('IMPORT_BATCH_SIZE', default=500)
+IMPORT_IMAGE_WORKERS = env.int('IMPORT_IMAGE_WORKERS', default=4)
+
+# Concurrent executions of expensive actions, shared by all workers.
+# Requests over the limit wait up to CONCURRENCY_QUEUE_TIMEOUT seconds,
+# then get 503; a slot of a crashed worker expires after CONCURRENCY_LEASE.
+CONCURRENCY_LIMITS = {
+    'recipe_create': env.int('CONCURRENCY_RECIPE_CREATE', default=4),
+    'recipe_import': env.int('CONCURRENCY_RECIPE_IMPORT', default=1),
+    'recipe_search': env.int('CONCURRENCY_RECIPE_SEARCH', default=8),
+    'recipe_export': env.int('CONCURRENCY_RECIPE_EXPORT', default=2),
+    'shopping_cart_download': env.int('CONCURRENCY_SHOPPING_CART_DOWNLOAD', default=4),
+}
+CONCURRENCY_QUEUE_TIMEOUT = env.float('CONCURRENCY_QUEUE_TIMEOUT', default=2)
+CONCURRENCY_RETRY_AFTER = 5
+CONCURRENCY_LEASE = 60
+
+# Generated files are spooled to disk and sent by the gateway:
+# 'nginx' (X-Accel-Redirect), 'sendfile' (X-Sendfile) or 'python' fallback
+FILE_DELIVERY = env.str('FILE_DELIVERY', default='python')
+SPOOL_ROOT = env.str('SPOOL_ROOT', default=os.path.join(BASE_DIR, 'spool'))
+SPOOL_URL = '/_spool/'
+SPOOL_MAX_AGE = env.int('SPOOL_MAX_AGE', default=60 * 60)
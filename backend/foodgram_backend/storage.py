@@ -0,0 +1,81 @@
+"""Хранилище файлов, адресуемых по содержимому."""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def file_digest(file):
+    """Хеш содержимого файла, позиция чтения восстанавливается."""
+    digest = hashlib.sha256()
+    position = file.tell() if hasattr(file, 'tell') else None
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    if position is not None:
+        file.seek(position)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по sha256 содержимого.
+
+    Одинаковые загрузки сохраняются один раз, а файл под данным именем
+    никогда не меняется, поэтому его можно кешировать навсегда
+    (Cache-Control: immutable). Каталог из upload_to сохраняется, файлы
+    раскладываются по подкаталогам из первых двух символов хеша.
+    """
+
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        digest = file_digest(content)
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def has_content(self, name, content):
+        """Совпадает ли content с файлом name без чтения самого файла."""
+        stem = posixpath.splitext(posixpath.basename(name))[0]
+        return stem == file_digest(content)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежая дата изменения защищает файл от сборки мусора.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Файл с тем же именем хранит то же содержимое: суффикс не нужен.
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Файл пишется под временным именем и появляется под своим только
+        # целиком. Параллельная загрузка того же содержимого находит готовый
+        # файл и считает его своим, а не получает имя с суффиксом.
+        temporary = f'{full_path}.{uuid.uuid4().hex}.tmp'
+        fd = os.open(temporary, self.OS_OPEN_FLAGS, 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            try:
+                os.link(temporary, full_path)
+            except FileExistsError:
+                os.utime(full_path)
+        finally:
+            os.unlink(temporary)
+        return name
@@ -0,0 +1,133 @@
+import shutil
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+
+from asgiref.local import Local
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram_backend.routers import use_primary
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+class ReplicaRoutingTest(SimpleTestCase):
+    """Основная база и реплика -- отдельные файлы SQLite.
+
+    Реплика -- копия основной базы, поэтому записи, сделанные после
+    копирования, видны только при чтении из основной.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        databases = {
+            alias: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': str(directory / f'{alias}.sqlite3'),
+            }
+            for alias in ('default', 'replica_0')
+        }
+        self.switch_databases(databases)
+        # Миграции с RunPython читают данные через маршрутизатор.
+        with use_primary():
+            call_command('migrate', verbosity=0)
+        users = [
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='pass12345', first_name='Имя', last_name='Фамилия'
+            )
+            for name in ('writer', 'reader')
+        ]
+        self.clients = {}
+        for user in users:
+            client = APIClient()
+            client.credentials(
+                HTTP_AUTHORIZATION='Token '
+                + Token.objects.create(user=user).key
+            )
+            self.clients[user.username] = client
+        connections.close_all()
+        shutil.copy(
+            databases['default']['NAME'], databases['replica_0']['NAME']
+        )
+        # Рецепт появился в основной базе, но ещё не в реплике.
+        with use_primary():
+            self.recipe = Recipe.objects.create(
+                author=users[0], name='Омлет', text='Описание',
+                cooking_time=10, image='recipes/images/omelette.png'
+            )
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def switch_databases(self, databases):
+        settings_override = override_settings(DATABASES=databases)
+        with warnings.catch_warnings():
+            # Django предупреждает, что соединения не пересоздаются сами.
+            warnings.simplefilter('ignore')
+            settings_override.enable()
+        saved = connections.settings, connections._connections
+        connections.__dict__['settings'] = databases
+        connections._connections = Local(connections.thread_critical)
+
+        def restore():
+            connections.close_all()
+            connections.__dict__['settings'], connections._connections = saved
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                settings_override.disable()
+
+        self.addCleanup(restore)
+
+    def test_reads_go_to_replica(self):
+        self.assertFalse(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        with use_primary():
+            self.assertTrue(
+                Recipe.objects.filter(pk=self.recipe.pk).exists()
+            )
+        self.assertEqual(self.clients['reader'].get(self.url).status_code, 404)
+
+    def test_unsafe_request_reads_primary(self):
+        # Обработчик ищет рецепт, которого в реплике нет.
+        response = self.clients['reader'].post(f'{self.url}favorite/')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    @override_settings(DB_REPLICA_STICKY_SECONDS=1)
+    def test_read_after_write(self):
+        writer, reader = self.clients['writer'], self.clients['reader']
+        self.assertEqual(writer.get(self.url).status_code, 404)
+        response = writer.post(f'{self.url}shopping_cart/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(writer.get(self.url).status_code, 200)
+        # Закрепление касается только клиента, который писал.
+        self.assertEqual(reader.get(self.url).status_code, 404)
+        time.sleep(1.1)
+        self.assertEqual(writer.get(self.url).status_code, 404)
+
+    def test_read_after_recipe_save(self):
+        writer, reader = self.clients['writer'], self.clients['reader']
+        with use_primary():
+            tag = Tag.objects.create(name='Завтрак', color='#FFFFFF',
+                                     slug='breakfast')
+            ingredient = Ingredient.objects.create(name='Яйцо',
+                                                   measurement_unit='шт')
+        response = writer.patch(self.url, {
+            'text': 'Новое описание',
+            'tags': [tag.id],
+            'ingredients': [{'id': ingredient.id, 'amount': 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = writer.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['text'], 'Новое описание')
+        self.assertEqual(reader.get(self.url).status_code, 404)
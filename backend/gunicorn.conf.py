@@ -0,0 +1,33 @@
+"""Настройки gunicorn.
+
+Приложение загружается в мастере (preload_app), воркеры получают его
+при fork без повторного импорта, поэтому запускаются быстро и делят
+неизменённые страницы памяти. Воркеры перезапускаются после max_requests
+запросов со случайным разбросом, чтобы не перезапускаться одновременно.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'foodgram_backend.wsgi'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8080')
+
+preload_app = True
+worker_class = 'gthread'
+workers = int(os.environ.get(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1
+))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+
+def when_ready(server):
+    # Тяжёлые модули загружаются один раз в мастере, а не в каждом воркере.
+    from api.pdf import renderer
+
+    renderer.setup()
+    import numpy  # noqa: F401
+    import scipy.sparse  # noqa: F401
@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
                      ShoppingCart, Tag)
+from .signals import composition_changed
 
 
 class RecipeTagInline(admin.TabularInline):
@@ -76,6 +77,16 @@ class RecipeAdmin(admin.ModelAdmin):
     filter_horizontal = ('tags',)
     list_display_links = ('name',)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change and any(
+            formset.model is RecipeIngredient and formset.has_changed()
+            for formset in formsets
+        ):
+            composition_changed.send(
+                sender=Recipe, instance=form.instance, created=False
+            )
+
     @admin.display(
         description='Число добавлений рецепта в избранное'
     )
@@ -0,0 +1,81 @@
+"""Журнал изменений рецептов для дельта-синхронизации клиентов.
+
+Каждое создание, изменение и удаление рецепта добавляет в RecipeChange
+запись в той же транзакции, одну на рецепт за транзакцию, сколько бы
+строк состава и тегов в ней ни менялось. Клиент хранит токен -- id последней
+полученной записи -- и запрашивает только записи после него, так что
+синхронизация стоит O(изменений), а не O(каталога).
+
+id выдаются при вставке, а видны после коммита, поэтому запись с меньшим
+id может появиться позже записи с большим. Чтобы клиент её не пропустил,
+читаются только записи старше RECIPE_CHANGES_SETTLE секунд.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from foodgram_backend.db import first_in_transaction, take_from_transaction
+
+from .models import RecipeChange
+
+
+def record(*recipe_ids, deleted=False):
+    """Записывает изменение рецептов, ещё не записанных в транзакции.
+
+    Удаление перекрывает изменение, записанное в той же транзакции: его
+    запись убирается, и от транзакции остаётся одна отметка об удалении.
+    """
+    if deleted:
+        superseded = take_from_transaction(
+            'recipe_changes',
+            lambda change: change[0] in recipe_ids and not change[1]
+        )
+        for recipe_id, _ in superseded:
+            RecipeChange.objects.filter(id__in=RecipeChange.objects.filter(
+                recipe_id=recipe_id, deleted=False
+            ).order_by('-id').values('id')[:1]).delete()
+    recipe_ids = first_in_transaction(
+        'recipe_changes', ((recipe_id, deleted) for recipe_id in recipe_ids)
+    )
+    RecipeChange.record(
+        *(recipe_id for recipe_id, _ in recipe_ids), deleted=deleted
+    )
+
+
+def read(since, limit):
+    """Устоявшиеся записи после токена since, не больше limit."""
+    horizon = timezone.now() - timedelta(
+        seconds=settings.RECIPE_CHANGES_SETTLE
+    )
+    return list(RecipeChange.objects.filter(
+        id__gt=since, created_at__lte=horizon
+    ).order_by('id')[:limit])
+
+
+def latest(changes):
+    """(id изменённых рецептов, id удалённых) по последней записи каждого."""
+    deleted = {}
+    for change in changes:
+        deleted.pop(change.recipe_id, None)
+        deleted[change.recipe_id] = change.deleted
+    return (
+        [recipe_id for recipe_id, gone in deleted.items() if not gone],
+        [recipe_id for recipe_id, gone in deleted.items() if gone],
+    )
+
+
+def compact():
+    """Удаляет записи, перекрытые более поздними по тому же рецепту.
+
+    Последняя запись рецепта остаётся, поэтому клиент с любым токеном
+    по-прежнему получит его итоговое состояние или отметку об удалении.
+    """
+    superseded = RecipeChange.objects.filter(Exists(
+        RecipeChange.objects.filter(
+            recipe_id=OuterRef('recipe_id'), id__gt=OuterRef('id')
+        )
+    ))
+    deleted, _ = superseded.delete()
+    return deleted
@@ -0,0 +1,151 @@
+"""Ингредиенты, которые часто встречаются в рецептах вместе.
+
+Число общих рецептов для всех пар ингредиентов -- это произведение
+транспонированной бинарной матрицы рецепт x ингредиент на саму себя.
+Близость пары -- число общих рецептов, нормированное на частоты обоих
+ингредиентов (коэффициент Отиаи), так что соль не оказывается соседом
+каждого ингредиента. Для каждого ингредиента хранятся top-N соседей.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from foodgram_backend.constants import INGREDIENT_NEIGHBOURS
+from foodgram_backend.lazy import LazyModule
+
+from .models import IngredientNeighbour, RecipeIngredient
+from .similarity import load_pairs, top_k
+
+np = LazyModule('numpy')
+sparse = LazyModule('scipy.sparse')
+
+
+def neighbour_rows(ingredient_id, columns, shared, frequency, k):
+    """(ingredient_id, neighbour_id, recipes, score) для одного ингредиента.
+
+    columns -- id соседей, shared -- число общих рецептов с каждым,
+    frequency(ids) -- число рецептов с каждым ингредиентом.
+    """
+    keep = columns != ingredient_id
+    columns, shared = columns[keep], shared[keep]
+    if not len(columns):
+        return
+    scores = shared / np.sqrt(
+        frequency(np.array([ingredient_id])) * frequency(columns)
+    )
+    best, values = top_k(np.arange(len(columns)), scores, k)
+    for position, value in zip(best, values):
+        yield (ingredient_id, int(columns[position]),
+               int(shared[position]), float(value))
+
+
+def build(k=INGREDIENT_NEIGHBOURS):
+    """Пересчитывает соседей для всех ингредиентов."""
+    pairs = load_pairs()
+    rows = []
+    if len(pairs):
+        _, recipes = np.unique(pairs[:, 0], return_inverse=True)
+        ingredient_ids, cols = np.unique(pairs[:, 1], return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int32), (recipes, cols)),
+            shape=(recipes.max() + 1, len(ingredient_ids))
+        )
+        # Повторы ингредиента в рецепте не должны удваивать счётчики.
+        matrix.data[:] = 1
+        counts = (matrix.T @ matrix).tocsr()
+        totals = counts.diagonal()
+
+        def frequency(columns):
+            return totals[np.searchsorted(ingredient_ids, columns)]
+
+        for row in range(counts.shape[0]):
+            low, high = counts.indptr[row], counts.indptr[row + 1]
+            rows.extend(
+                IngredientNeighbour(ingredient_id=ingredient_id,
+                                    neighbour_id=neighbour_id,
+                                    recipes=shared, score=score)
+                for ingredient_id, neighbour_id, shared, score
+                in neighbour_rows(
+                    int(ingredient_ids[row]),
+                    ingredient_ids[counts.indices[low:high]],
+                    counts.data[low:high], frequency, k
+                )
+            )
+    with transaction.atomic():
+        IngredientNeighbour.objects.all().delete()
+        IngredientNeighbour.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def refresh(ingredient_ids, k=INGREDIENT_NEIGHBOURS):
+    """Пересчитывает соседей указанных ингредиентов.
+
+    Число общих рецептов меняется только у пар ингредиентов из
+    изменённого рецепта, поэтому их списки пересчитываются заново. В
+    остальных списках меняется лишь частота этих ингредиентов: близость
+    там пересчитывается по сохранённому числу общих рецептов, а состав
+    top-N уточнится при следующем полном build().
+    """
+    ingredient_ids = set(ingredient_ids)
+    if not ingredient_ids:
+        return
+    anchor = 'recipe__recipe_recipeingredient__ingredient_id'
+    shared = {}
+    for ingredient_id, neighbour_id, recipes in (
+        RecipeIngredient.objects.filter(**{f'{anchor}__in': ingredient_ids})
+        .order_by().values(anchor, 'ingredient_id')
+        .annotate(recipes=Count('recipe_id', distinct=True))
+        .values_list(anchor, 'ingredient_id', 'recipes')
+    ):
+        shared.setdefault(ingredient_id, []).append((neighbour_id, recipes))
+    stale = list(
+        IngredientNeighbour.objects.filter(
+            neighbour_id__in=ingredient_ids
+        ).exclude(ingredient_id__in=ingredient_ids)
+    )
+    totals = dict(
+        RecipeIngredient.objects.filter(
+            ingredient_id__in={
+                neighbour_id
+                for neighbours in shared.values()
+                for neighbour_id, _ in neighbours
+            } | {row.ingredient_id for row in stale}
+        ).order_by().values('ingredient_id').annotate(
+            recipes=Count('recipe_id', distinct=True)
+        ).values_list('ingredient_id', 'recipes')
+    )
+
+    def frequency(columns):
+        return np.array([totals.get(int(pk), 0) for pk in columns])
+
+    rows = []
+    for ingredient_id, neighbours in shared.items():
+        columns, counts = np.array(neighbours, dtype=np.int64).T
+        rows.extend(
+            IngredientNeighbour(ingredient_id=ingredient_id,
+                                neighbour_id=neighbour_id,
+                                recipes=recipes, score=score)
+            for ingredient_id, neighbour_id, recipes, score
+            in neighbour_rows(ingredient_id, columns, counts, frequency, k)
+        )
+    with transaction.atomic():
+        IngredientNeighbour.objects.filter(
+            ingredient_id__in=ingredient_ids
+        ).delete()
+        IngredientNeighbour.objects.bulk_create(rows, batch_size=1000)
+        # Ингредиент, которого не осталось ни в одном рецепте, не сосед.
+        gone = [
+            row for row in stale
+            if row.ingredient_id not in totals
+            or row.neighbour_id not in totals
+        ]
+        IngredientNeighbour.objects.filter(
+            id__in=[row.id for row in gone]
+        ).delete()
+        stale = [row for row in stale if row not in gone]
+        for row in stale:
+            row.score = float(row.recipes / np.sqrt(
+                totals[row.ingredient_id] * totals[row.neighbour_id]
+            ))
+        IngredientNeighbour.objects.bulk_update(
+            stale, ['score'], batch_size=1000
+        )
@@ -0,0 +1,89 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+Рецепт при публикации копируется в ленты подписчиков (fan-out). Для
+авторов с числом подписчиков больше FEED_FANOUT_LIMIT копирование не
+делается: такие авторы попадают в FanInAuthor, и их рецепты подмешиваются
+при чтении (fan-in).
+"""
+from django.conf import settings
+
+from users.models import Follow
+
+from .models import FanInAuthor, FeedEntry, Recipe
+
+
+def fan_out(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    author_id = recipe.author_id
+    if FanInAuthor.objects.filter(author_id=author_id).exists():
+        return
+    followers = Follow.objects.filter(following_id=author_id)
+    if followers.count() > settings.FEED_FANOUT_LIMIT:
+        FanInAuthor.objects.get_or_create(author_id=author_id)
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe=recipe, author_id=author_id)
+            for user_id in followers.values_list('user_id', flat=True)
+            .iterator()
+        ),
+        batch_size=1000, ignore_conflicts=True
+    )
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту последними рецептами нового автора подписки."""
+    if FanInAuthor.objects.filter(author_id=author_id).exists():
+        return
+    recipe_ids = Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-id').values_list('id', flat=True)[:settings.FEED_BACKFILL]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for recipe_id in recipe_ids
+        ),
+        ignore_conflicts=True
+    )
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def trim(user_id, length=None):
+    """Оставляет в ленте не больше length последних записей."""
+    length = length or settings.FEED_MAX_LENGTH
+    cutoff = FeedEntry.objects.filter(user_id=user_id).order_by(
+        '-recipe_id'
+    ).values_list('recipe_id', flat=True)[length:length + 1]
+    cutoff = list(cutoff)
+    if cutoff:
+        FeedEntry.objects.filter(
+            user_id=user_id, recipe_id__lte=cutoff[0]
+        ).delete()
+
+
+def read(user, before=None, limit=10):
+    """id рецептов ленты по убыванию, строго меньше курсора before."""
+    entries = FeedEntry.objects.filter(user=user)
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+    recipe_ids = set(
+        entries.order_by('-recipe_id').values_list(
+            'recipe_id', flat=True
+        )[:limit]
+    )
+    fan_in_authors = FanInAuthor.objects.filter(
+        author__following__user=user
+    ).values_list('author_id', flat=True)
+    if fan_in_authors:
+        recipes = Recipe.objects.filter(author_id__in=list(fan_in_authors))
+        if before is not None:
+            recipes = recipes.filter(id__lt=before)
+        recipe_ids.update(
+            recipes.order_by('-id').values_list('id', flat=True)[:limit]
+        )
+    return sorted(recipe_ids, reverse=True)[:limit]
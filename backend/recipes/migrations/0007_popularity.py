@@ -0,0 +1,56 @@
+# Generated by Django 3.2.16 on 2026-10-19 17:04
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.timezone import utc
+
+
+def fill_popularity(apps, schema_editor):
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipePopularity = apps.get_model('recipes', 'RecipePopularity')
+    scores = {}
+    for model in (Favorite, ShoppingCart):
+        for recipe_id in model.objects.values_list('recipe_id', flat=True):
+            scores[recipe_id] = scores.get(recipe_id, 0) + 1
+    RecipePopularity.objects.bulk_create(
+        RecipePopularity(recipe_id=recipe_id, score=score)
+        for recipe_id, score in scores.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipePopularity',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.IntegerField(db_index=True, default=0, verbose_name='За всё время')),
+                ('score_week', models.IntegerField(db_index=True, default=0, verbose_name='За неделю')),
+                ('score_day', models.IntegerField(db_index=True, default=0, verbose_name='За сутки')),
+            ],
+            options={
+                'verbose_name': 'популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=datetime.datetime(1970, 1, 1, 0, 0, tzinfo=utc), verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=datetime.datetime(1970, 1, 1, 0, 0, tzinfo=utc), verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
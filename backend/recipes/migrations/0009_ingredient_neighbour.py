@@ -0,0 +1,36 @@
+# Generated by Django 3.2.16 on 2026-10-19 17:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_similar_recipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipes', models.PositiveIntegerField(verbose_name='Общих рецептов')),
+                ('score', models.FloatField(verbose_name='Близость')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient', verbose_name='Соседний ингредиент')),
+            ],
+            options={
+                'verbose_name': 'соседний ингредиент',
+                'verbose_name_plural': 'Соседние ингредиенты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ingredientneighbour',
+            index=models.Index(fields=['ingredient', '-score'], name='ingredient_neighbour_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientneighbour',
+            constraint=models.UniqueConstraint(fields=('ingredient', 'neighbour'), name='unique_pair_ingredient_neighbour'),
+        ),
+    ]
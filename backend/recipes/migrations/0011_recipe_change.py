@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-19 17:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_recipe_changes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeChange = apps.get_model('recipes', 'RecipeChange')
+    RecipeChange.objects.bulk_create(
+        (
+            RecipeChange(recipe_id=recipe_id)
+            for recipe_id in Recipe.objects.order_by(
+                'updated_at', 'id'
+            ).values_list('id', flat=True).iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_shopping_list'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recipe_id', models.IntegerField(verbose_name='Рецепт')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалён')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'изменение рецепта',
+                'verbose_name_plural': 'Изменения рецептов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipechange',
+            index=models.Index(fields=['recipe_id', 'id'], name='recipe_change_recipe_idx'),
+        ),
+        migrations.RunPython(fill_recipe_changes, migrations.RunPython.noop),
+    ]
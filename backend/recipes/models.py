@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from colorfield.fields import ColorField
 
@@ -76,6 +77,9 @@ class Recipe(models.Model):
         Ingredient, through='RecipeIngredient',
         related_name='ingredient_recipe', verbose_name='ингредиент'
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True
+    )
 
     class Meta:
         verbose_name = 'рецепт'
@@ -85,6 +89,11 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def touch(cls, *recipe_ids):
+        """Обновляет updated_at после изменения связей рецептов."""
+        cls.objects.filter(id__in=recipe_ids).update(updated_at=timezone.now())
+
 
 class RecipeTag(models.Model):
     recipe = models.ForeignKey(
@@ -140,6 +149,8 @@ class Favorite(models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE,
         related_name='favorite_recipe', verbose_name='Избранный рецепт')
+    created_at = models.DateTimeField(
+        'Дата добавления', auto_now_add=True, db_index=True)
 
     class Meta:
         verbose_name = 'объект избранного'
@@ -162,6 +173,8 @@ class ShoppingCart(models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE,
         related_name='recipe_in_cart', verbose_name='Рецепт')
+    created_at = models.DateTimeField(
+        'Дата добавления', auto_now_add=True, db_index=True)
 
     class Meta:
         verbose_name = 'объект корзины'
@@ -175,3 +188,190 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe} {self.user}'
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='shopping_list', verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE,
+        related_name='+', verbose_name='Ингредиент')
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_pair_user_ingredient_in_list'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} {self.user}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика, записывается при публикации."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='feed_entries', verbose_name='Подписчик')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='feed_entries', verbose_name='Рецепт')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+', verbose_name='Автор')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_pair_user_recipe_in_feed'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='feed_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.user}'
+
+
+class FanInAuthor(models.Model):
+    """Автор со слишком большим числом подписчиков для рассылки по лентам.
+
+    Его рецепты не копируются в ленты, а подмешиваются при чтении.
+    """
+    author = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        related_name='fan_in', verbose_name='Автор')
+
+    class Meta:
+        verbose_name = 'автор без рассылки по лентам'
+        verbose_name_plural = 'Авторы без рассылки по лентам'
+
+    def __str__(self):
+        return str(self.author)
+
+
+class RecipePopularity(models.Model):
+    """Счётчики популярности рецепта: всё время, неделя и сутки.
+
+    Обновляются при добавлении в избранное или корзину и удалении оттуда;
+    недельный и суточный счётчики пересчитываются командой
+    update_popularity.
+    """
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        related_name='popularity', verbose_name='Рецепт')
+    score = models.IntegerField('За всё время', default=0, db_index=True)
+    score_week = models.IntegerField('За неделю', default=0, db_index=True)
+    score_day = models.IntegerField('За сутки', default=0, db_index=True)
+
+    class Meta:
+        verbose_name = 'популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+    def __str__(self):
+        return str(self.recipe)
+
+
+class SimilarRecipe(models.Model):
+    """Заранее вычисленный похожий рецепт и косинусная близость."""
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='similar_recipes', verbose_name='Рецепт')
+    similar = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='+', verbose_name='Похожий рецепт')
+    score = models.FloatField('Близость')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_pair_recipe_similar'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'], name='similar_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.similar}'
+
+
+class IngredientNeighbour(models.Model):
+    """Ингредиент, часто встречающийся в рецептах вместе с данным."""
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE,
+        related_name='neighbours', verbose_name='Ингредиент')
+    neighbour = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE,
+        related_name='+', verbose_name='Соседний ингредиент')
+    recipes = models.PositiveIntegerField('Общих рецептов')
+    score = models.FloatField('Близость')
+
+    class Meta:
+        verbose_name = 'соседний ингредиент'
+        verbose_name_plural = 'Соседние ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ingredient', 'neighbour'],
+                name='unique_pair_ingredient_neighbour'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['ingredient', '-score'],
+                name='ingredient_neighbour_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} {self.neighbour}'
+
+
+class RecipeChange(models.Model):
+    """Запись журнала изменений рецептов для синхронизации клиентов.
+
+    id -- монотонный токен изменения. recipe_id не внешний ключ: запись об
+    удалении (deleted) переживает рецепт. Пишется в той же транзакции,
+    что и изменение рецепта; записи, перекрытые более поздними по тому же
+    рецепту, удаляет команда compact_recipe_changes.
+    """
+    id = models.BigAutoField(primary_key=True)
+    recipe_id = models.IntegerField('Рецепт')
+    deleted = models.BooleanField('Удалён', default=False)
+    created_at = models.DateTimeField('Дата изменения', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'изменение рецепта'
+        verbose_name_plural = 'Изменения рецептов'
+        indexes = [
+            models.Index(
+                fields=['recipe_id', 'id'], name='recipe_change_recipe_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.id} {self.recipe_id}'
+
+    @classmethod
+    def record(cls, *recipe_ids, deleted=False):
+        cls.objects.bulk_create(
+            cls(recipe_id=recipe_id, deleted=deleted)
+            for recipe_id in set(recipe_ids)
+        )
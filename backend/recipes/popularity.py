@@ -0,0 +1,137 @@
+"""Счётчики популярности рецептов для рейтингов.
+
+Добавление в избранное или корзину даёт рецепту +1, удаление -1.
+Счётчик за всё время ведётся точно; недельный и суточный при изменениях
+только увеличиваются и уменьшаются, а выбывание старых добавлений из окна
+учитывает периодический пересчёт compact().
+
+Первые POPULAR_TOP позиций списка ordering=popular читаются из
+RecipePopularity по индексу score (Ranking), а не сортировкой всего
+каталога через соединение.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from foodgram_backend.constants import POPULAR_TOP
+
+from .models import Favorite, Recipe, RecipePopularity, ShoppingCart
+
+WINDOWS = {
+    'score_week': timedelta(days=7),
+    'score_day': timedelta(days=1),
+}
+SCORE_FIELDS = {
+    'all': 'score',
+    'week': 'score_week',
+    'day': 'score_day',
+}
+
+
+def record(recipe_id, created_at, delta):
+    """Учитывает добавление (delta=1) или удаление (delta=-1)."""
+    now = timezone.now()
+    changes = {'score': F('score') + delta}
+    for field, window in WINDOWS.items():
+        if created_at >= now - window:
+            changes[field] = F(field) + delta
+    popularity = RecipePopularity.objects.filter(recipe_id=recipe_id)
+    if popularity.update(**changes) or delta < 0:
+        return
+    RecipePopularity.objects.get_or_create(recipe_id=recipe_id)
+    popularity.update(**changes)
+
+
+def top(window, limit):
+    """id самых популярных рецептов: чтение limit строк по индексу."""
+    field = SCORE_FIELDS[window]
+    return list(
+        RecipePopularity.objects.filter(**{f'{field}__gt': 0})
+        .order_by(f'-{field}', '-recipe_id')
+        .values_list('recipe_id', flat=True)[:limit]
+    )
+
+
+def ordered(queryset):
+    return queryset.order_by(
+        F('popularity__score').desc(nulls_last=True), '-id'
+    )
+
+
+class Ranking:
+    """id всех рецептов по убыванию популярности для Paginator.
+
+    Срез в пределах первых POPULAR_TOP позиций читается через top(),
+    если до его конца есть рецепты с ненулевым счётом, остальные --
+    сортировкой каталога.
+    """
+
+    def __init__(self, queryset=None):
+        self.queryset = Recipe.objects.all() if queryset is None else queryset
+        self.length = None
+
+    def __len__(self):
+        if self.length is None:
+            self.length = self.queryset.count()
+        return self.length
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        if stop <= POPULAR_TOP:
+            recipe_ids = top('all', stop)
+            if len(recipe_ids) == stop:
+                return recipe_ids[start:]
+        return list(
+            ordered(self.queryset).values_list('id', flat=True)[start:stop]
+        )
+
+
+def count_added(since=None):
+    scores = {}
+    for model in (Favorite, ShoppingCart):
+        rows = model.objects.all()
+        if since is not None:
+            rows = rows.filter(created_at__gte=since)
+        for recipe_id, added in rows.values('recipe_id').annotate(
+            added=Count('id')
+        ).values_list('recipe_id', 'added'):
+            scores[recipe_id] = scores.get(recipe_id, 0) + added
+    return scores
+
+
+def compact(full=False):
+    """Пересчитывает оконные счётчики, с full=True и общий."""
+    now = timezone.now()
+    windows = {
+        field: count_added(now - window) for field, window in WINDOWS.items()
+    }
+    if full:
+        windows['score'] = count_added()
+    fields = list(windows)
+    recipe_ids = set().union(*windows.values())
+    with transaction.atomic():
+        stale = Q()
+        for field in fields:
+            stale |= ~Q(**{field: 0})
+        RecipePopularity.objects.filter(stale).exclude(
+            recipe_id__in=recipe_ids
+        ).update(**{field: 0 for field in fields})
+        existing = RecipePopularity.objects.in_bulk(recipe_ids)
+        RecipePopularity.objects.bulk_create(
+            RecipePopularity(recipe_id=recipe_id)
+            for recipe_id in recipe_ids if recipe_id not in existing
+        )
+        rows = [
+            RecipePopularity(
+                recipe_id=recipe_id,
+                **{
+                    field: windows[field].get(recipe_id, 0)
+                    for field in fields
+                }
+            )
+            for recipe_id in recipe_ids
+        ]
+        RecipePopularity.objects.bulk_update(rows, fields, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,125 @@
+"""Список покупок: суммы ингредиентов по рецептам в корзине.
+
+Суммы хранятся в ShoppingListItem и пересчитываются только для затронутых
+пользователей и ингредиентов в той же транзакции, что и изменение корзины
+или состава рецепта; правка состава пересчитывается один раз на рецепт,
+сколько бы строк в ней ни менялось. Полный пересчёт -- rebuild().
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+User = get_user_model()
+
+CART_USER = 'recipe__recipe_in_cart__user_id'
+
+
+def totals(**filters):
+    """(user_id, ingredient_id, amount) по рецептам в корзинах."""
+    return RecipeIngredient.objects.filter(
+        recipe__recipe_in_cart__isnull=False, **filters
+    ).order_by().values(CART_USER, 'ingredient_id').annotate(
+        total=Sum('amount')
+    ).values_list(CART_USER, 'ingredient_id', 'total')
+
+
+def recount(user_ids, ingredient_ids):
+    """Пересчитывает суммы ингредиентов в списках пользователей."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    ingredient_ids = set(ingredient_ids)
+    if not ingredient_ids:
+        return
+    with transaction.atomic():
+        # Блокировка пользователей упорядочивает пересчёт одного списка.
+        list(User.objects.select_for_update().filter(
+            id__in=user_ids
+        ).order_by('id').values_list('id', flat=True))
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=ingredient_ids
+        ).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             amount=amount)
+            for user_id, ingredient_id, amount in totals(**{
+                f'{CART_USER}__in': user_ids,
+                'ingredient_id__in': ingredient_ids,
+            })
+        )
+
+
+def ingredients_of(recipe_id):
+    return RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', flat=True)
+
+
+def cart_changed(user_id, recipe_id):
+    """Рецепт добавлен в корзину или убран из неё."""
+    recount([user_id], ingredients_of(recipe_id))
+
+
+def recipes_changed(changes):
+    """Изменился состав рецептов, которые могут лежать в корзинах.
+
+    changes -- пары (id рецепта, id ингредиента изменённой строки или None,
+    если пересчитать нужно весь состав).
+    """
+    changed = {}
+    for recipe_id, ingredient_id in changes:
+        changed.setdefault(recipe_id, set()).add(ingredient_id)
+    for recipe_id, ingredient_ids in changed.items():
+        if None in ingredient_ids:
+            ingredient_ids = ingredient_ids - {None} | set(
+                ingredients_of(recipe_id)
+            )
+        recount(
+            ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('user_id', flat=True),
+            ingredient_ids
+        )
+
+
+def recipe_deleted(recipe_id):
+    """Пары (пользователь, ингредиент) удаляемого рецепта из корзин.
+
+    Вызывается до удаления: после фиксации не останется ни корзин с
+    рецептом, ни его состава.
+    """
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True))
+    if not user_ids:
+        return []
+    return [
+        (user_id, ingredient_id)
+        for ingredient_id in ingredients_of(recipe_id)
+        for user_id in user_ids
+    ]
+
+
+def lists_changed(pairs):
+    """Пересчёт по парам (пользователь, ингредиент)."""
+    recount(
+        {user_id for user_id, _ in pairs},
+        {ingredient_id for _, ingredient_id in pairs}
+    )
+
+
+def rebuild():
+    """Пересчитывает списки покупок всех пользователей."""
+    with transaction.atomic():
+        ShoppingListItem.objects.all().delete()
+        rows = ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(user_id=user_id,
+                                 ingredient_id=ingredient_id, amount=amount)
+                for user_id, ingredient_id, amount in totals().iterator()
+            ),
+            batch_size=1000
+        )
+    return len(rows)
@@ -0,0 +1,191 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from foodgram_backend.db import (first_in_transaction, on_commit_once,
+                                 take_from_transaction)
+from users.models import Follow
+
+from . import changes, feed, popularity, shopping_list, similarity
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                     ShoppingCart, Tag, User)
+
+# Состав рецепта изменён bulk-операциями, которые не отправляют сигналы
+# строк. Аргументы: instance -- рецепт, created -- рецепт новый.
+composition_changed = Signal()
+
+
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_link_changed(sender, instance, **kwargs):
+    links_changed(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def recipe_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        links_changed(instance.pk)
+    elif pk_set:
+        links_changed(*pk_set)
+
+
+def links_changed(*recipe_ids):
+    # Сигнал приходит на каждую строку связей; рецепт достаточно отметить
+    # один раз за транзакцию.
+    recipe_ids = first_in_transaction('recipe_links', recipe_ids)
+    if recipe_ids:
+        Recipe.touch(*recipe_ids)
+        changes.record(*recipe_ids)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    # Название и цвет тега входят в ответ рецепта, поэтому ETag и
+    # Last-Modified рецептов должны смениться вместе с ними.
+    Recipe.objects.filter(tags=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    Recipe.objects.filter(
+        ingredients=instance
+    ).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if created or (update_fields is not None
+                   and update_fields <= {'last_login'}):
+        return
+    Recipe.objects.filter(author=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    changes.record(instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    # Связи удаляются каскадом вместе с рецептом: обновлять его и записывать
+    # изменение незачем.
+    first_in_transaction('recipe_links', [instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    changes.record(instance.pk, deleted=True)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: feed.fan_out(instance))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    # Состав нового рецепта записывается bulk_create после его сохранения.
+    if created:
+        composition_changed.send(sender=Recipe, instance=instance,
+                                 created=True)
+
+
+@receiver(composition_changed, sender=Recipe)
+def recipe_composition_saved(sender, instance, **kwargs):
+    similarity_changed(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    similarity_changed(instance.recipe_id)
+
+
+def similarity_changed(recipe_id):
+    # Правка состава удаляет и добавляет много строк, а пересчёт нужен
+    # один на рецепт после фиксации.
+    on_commit_once('similarity', [recipe_id], similarity.refresh_many)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feed.remove(instance.user_id, instance.following_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_marked(sender, instance, created, **kwargs):
+    if created:
+        popularity.record(instance.recipe_id, instance.created_at, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_unmarked(sender, instance, **kwargs):
+    popularity.record(instance.recipe_id, instance.created_at, -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def cart_changed(sender, instance, **kwargs):
+    shopping_list.cart_changed(instance.user_id, instance.recipe_id)
+
+
+@receiver(composition_changed, sender=Recipe)
+def carted_recipe_saved(sender, instance, created, **kwargs):
+    # Нового рецепта ещё нет ни в одной корзине.
+    if created:
+        return
+    # Строки состава уже записаны: списки пересчитываются в той же
+    # транзакции один раз вместе с изменёнными строками.
+    shopping_list.recipes_changed(
+        carted_ingredients_taken(instance.pk) | {(instance.pk, None)}
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def carted_ingredient_changed(sender, instance, **kwargs):
+    # Строки без последующего composition_changed пересчитываются после
+    # фиксации, вне транзакции -- сразу.
+    on_commit_once(
+        'shopping_list', [(instance.recipe_id, instance.ingredient_id)],
+        shopping_list.recipes_changed
+    )
+
+
+def carted_ingredients_taken(recipe_id):
+    return take_from_transaction(
+        'shopping_list', lambda change: change[0] == recipe_id
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def carted_recipe_deleting(sender, instance, **kwargs):
+    # После удаления не останется ни корзин с рецептом, ни его состава.
+    instance._shopping_list_pairs = shopping_list.recipe_deleted(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def carted_recipe_deleted(sender, instance, **kwargs):
+    carted_ingredients_taken(instance.pk)
+    shopping_list.lists_changed(
+        getattr(instance, '_shopping_list_pairs', [])
+    )
@@ -0,0 +1,225 @@
+"""Похожие рецепты по составу ингредиентов.
+
+Рецепты представлены строками разреженной матрицы рецепт x ингредиент с
+весами TF-IDF и нормой L2, так что близость двух рецептов -- скалярное
+произведение строк. build() пересчитывает top-K для всего каталога
+блоками строк; refresh() после изменения одного рецепта пересчитывает
+его список и поправляет списки рецептов с общими ингредиентами.
+
+Кандидаты для refresh() берутся по самым редким ингредиентам рецепта, не
+больше SIMILAR_CANDIDATES: рецепты, общие с изменённым только по частым
+ингредиентам вроде соли, почти не похожи на него из-за малого веса IDF,
+а их перебор делал бы пересчёт линейным по каталогу.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from foodgram_backend.constants import SIMILAR_CANDIDATES, SIMILAR_RECIPES
+from foodgram_backend.lazy import LazyModule
+
+from .models import Recipe, RecipeIngredient, SimilarRecipe
+
+np = LazyModule('numpy')
+sparse = LazyModule('scipy.sparse')
+
+BLOCK_SIZE = 1000
+
+
+def load_pairs(recipe_ids=None):
+    rows = RecipeIngredient.objects.all()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    pairs = np.fromiter(
+        (
+            value
+            for pair in rows.values_list(
+                'recipe_id', 'ingredient_id'
+            ).iterator(chunk_size=10000)
+            for value in pair
+        ),
+        dtype=np.int64
+    )
+    return pairs.reshape(-1, 2)
+
+
+def idf(total, document_frequency):
+    return np.log((1 + total) / (1 + document_frequency)) + 1
+
+
+def build_matrix(pairs, weights):
+    """Матрица TF-IDF; weights(ingredient_ids) возвращает веса IDF."""
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, cols = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (weights(ingredient_ids, cols)[cols], (rows, cols)),
+        shape=(len(recipe_ids), len(ingredient_ids))
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    norms[norms == 0] = 1
+    return recipe_ids, (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def top_k(columns, values, k):
+    if len(values) > k:
+        best = np.argpartition(-values, k)[:k]
+        columns, values = columns[best], values[best]
+    order = np.argsort(-values, kind='stable')
+    return columns[order], values[order]
+
+
+def similar_rows(recipe_ids, matrix, k=SIMILAR_RECIPES):
+    """(recipe_id, similar_id, score) для каждой строки матрицы."""
+    transposed = matrix.T.tocsc()
+    for start in range(0, matrix.shape[0], BLOCK_SIZE):
+        block = (matrix[start:start + BLOCK_SIZE] @ transposed).tocsr()
+        for offset in range(block.shape[0]):
+            low, high = block.indptr[offset], block.indptr[offset + 1]
+            columns = block.indices[low:high]
+            values = block.data[low:high]
+            keep = (columns != start + offset) & (values > 0)
+            columns, values = top_k(columns[keep], values[keep], k)
+            recipe_id = int(recipe_ids[start + offset])
+            for column, value in zip(columns, values):
+                yield recipe_id, int(recipe_ids[column]), float(value)
+
+
+def build(k=SIMILAR_RECIPES):
+    """Пересчитывает таблицу похожих рецептов для всего каталога."""
+    pairs = load_pairs()
+    total = Recipe.objects.count()
+
+    def weights(ingredient_ids, cols):
+        return idf(total, np.bincount(cols, minlength=len(ingredient_ids)))
+
+    rows = []
+    if len(pairs):
+        recipe_ids, matrix = build_matrix(pairs, weights)
+        rows = [
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score)
+            for recipe_id, similar_id, score in similar_rows(
+                recipe_ids, matrix, k
+            )
+        ]
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        SimilarRecipe.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def candidate_ids(ingredient_ids, recipe_id, limit=SIMILAR_CANDIDATES):
+    """Рецепты с общими ингредиентами, начиная с самых редких из них."""
+    frequency = dict(
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=ingredient_ids
+        ).values('ingredient_id').annotate(
+            recipes=Count('recipe_id')
+        ).values_list('ingredient_id', 'recipes')
+    )
+    selected = []
+    total = 0
+    for ingredient_id in sorted(frequency, key=frequency.get):
+        if selected and total + frequency[ingredient_id] > limit:
+            break
+        selected.append(ingredient_id)
+        total += frequency[ingredient_id]
+    return set(
+        Recipe.objects.filter(
+            recipe_recipeingredient__ingredient_id__in=selected
+        ).exclude(id=recipe_id).order_by('-id').values_list(
+            'id', flat=True
+        ).distinct()[:limit]
+    )
+
+
+def refresh(recipe_id, k=SIMILAR_RECIPES):
+    """Обновляет похожие рецепты после изменения состава рецепта."""
+    own = list(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', flat=True))
+    candidates = candidate_ids(own, recipe_id)
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        # Рецепты без общих ингредиентов больше не похожи на этот.
+        SimilarRecipe.objects.filter(similar_id=recipe_id).exclude(
+            recipe_id__in=RecipeIngredient.objects.filter(
+                ingredient_id__in=own
+            ).values('recipe_id')
+        ).delete()
+        if not candidates:
+            return
+        pairs = load_pairs(candidates | {recipe_id})
+        total = Recipe.objects.count()
+        frequency = dict(
+            RecipeIngredient.objects.filter(
+                ingredient_id__in=set(pairs[:, 1].tolist())
+            ).values('ingredient_id').annotate(
+                recipes=Count('recipe_id')
+            ).values_list('ingredient_id', 'recipes')
+        )
+
+        def weights(ingredient_ids, cols):
+            return idf(total, np.array(
+                [frequency.get(int(pk), 0) for pk in ingredient_ids]
+            ))
+
+        recipe_ids, matrix = build_matrix(pairs, weights)
+        index = int(np.searchsorted(recipe_ids, recipe_id))
+        scores = (matrix @ matrix[index].T).toarray().ravel()
+        scores[index] = 0
+
+        columns, values = top_k(
+            np.flatnonzero(scores > 0), scores[scores > 0], k
+        )
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id,
+                          similar_id=int(recipe_ids[column]),
+                          score=float(value))
+            for column, value in zip(columns, values)
+        )
+        update_neighbours(recipe_id, dict(zip(
+            recipe_ids.tolist(), scores.tolist()
+        )), k)
+
+
+def refresh_many(recipe_ids, k=SIMILAR_RECIPES):
+    for recipe_id in sorted(recipe_ids):
+        refresh(recipe_id, k)
+
+
+def update_neighbours(recipe_id, scores, k):
+    """Вставляет рецепт в списки соседей, где он теперь входит в top-K."""
+    lists = {}
+    for row in SimilarRecipe.objects.filter(recipe_id__in=list(scores)):
+        lists.setdefault(row.recipe_id, []).append(row)
+    changed = {}
+    for neighbour_id, score in scores.items():
+        if neighbour_id == recipe_id:
+            continue
+        current = sorted(
+            (
+                (row.similar_id, row.score)
+                for row in lists.get(neighbour_id, [])
+                if row.similar_id != recipe_id
+            ),
+            key=lambda item: -item[1]
+        )
+        was_listed = len(current) != len(lists.get(neighbour_id, []))
+        if score > 0 and (len(current) < k or score > current[-1][1]):
+            current.append((recipe_id, score))
+            current.sort(key=lambda item: -item[1])
+        elif not was_listed:
+            continue
+        changed[neighbour_id] = current[:k]
+    if not changed:
+        return
+    SimilarRecipe.objects.filter(recipe_id__in=list(changed)).delete()
+    SimilarRecipe.objects.bulk_create(
+        (
+            SimilarRecipe(recipe_id=neighbour_id, similar_id=similar_id,
+                          score=score)
+            for neighbour_id, rows in changed.items()
+            for similar_id, score in rows
+        ),
+        batch_size=1000
+    )
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-19 17:27
+
+from django.db import migrations, models
+
+
+def fill_username_search(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    users = list(CustomUser.objects.only('id', 'username'))
+    for user in users:
+        user.username_search = user.username.casefold()
+    CustomUser.objects.bulk_update(
+        users, ['username_search'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_follow_forbid_subscribe_to_yourself'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='username_search',
+            field=models.TextField(default='', editable=False, help_text='username в casefold, по нему ищется префикс.', verbose_name='Имя пользователя для поиска'),
+        ),
+        migrations.RunPython(fill_username_search, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['username_search'], name='user_username_search_idx', opclasses=('text_pattern_ops',)),
+        ),
+    ]
@@ -20,6 +20,10 @@ class CustomUser(AbstractUser):
         'Фамилия', max_length=SHORT_FIELD, blank=False, null=False,
         help_text=f'Обязательное поле. Не более {SHORT_FIELD} символов.'
     )
+    username_search = models.TextField(
+        'Имя пользователя для поиска', editable=False, default='',
+        help_text='username в casefold, по нему ищется префикс.'
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'password', 'first_name', 'last_name')
 
@@ -30,6 +34,13 @@ class CustomUser(AbstractUser):
                 name='unique_pair_username_email'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('username_search',),
+                name='user_username_search_idx',
+                opclasses=('text_pattern_ops',)
+            ),
+        ]
         verbose_name = 'Пользователь'
         verbose_name_plural = 'пользователи'
         default_related_name = 'author'
@@ -37,6 +48,13 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        self.username_search = self.username.casefold()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'username' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'username_search'}
+        super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(